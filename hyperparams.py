@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
 import os
+import multiprocessing
+from types import SimpleNamespace
 
 
 def current_org() -> str:
@@ -11,8 +13,34 @@ COMMON = {
     "MODEL": os.environ.get("LLM_MODEL", "gpt-5"),
     "PDF_MAX_PAGES": int(os.environ.get("PDF_MAX_PAGES", "0")),
     "RETRIEVAL_K": int(os.environ.get("RETRIEVAL_K", "20")),
+    # chunk_nodes keeps lowercased title/text beside its chunks so retrieve doesn't re-lower them per call
+    "RETRIEVAL_PRECOMPUTE": os.environ.get("RETRIEVAL_PRECOMPUTE", "1").strip().lower() not in ("0", "false", "no"),
     "EVIDENCE_TOP_N": int(os.environ.get("EVIDENCE_TOP_N", "150")),
     "PIN_TABLE_TOPN": int(os.environ.get("PIN_TABLE_TOPN", "25")),
+    "LLM_CONCURRENCY": int(os.environ.get("LLM_CONCURRENCY", "8")),
+    "OPENAI_MAX_RPM": int(os.environ.get("OPENAI_MAX_RPM", "500")),
+    "OPENAI_MAX_TPM": int(os.environ.get("OPENAI_MAX_TPM", "500000")),
+    # Page batches packed into one extraction request as numbered sections
+    "BATCHES_PER_REQUEST": int(os.environ.get("BATCHES_PER_REQUEST", "3")),
+    # Extract with the cheaper cascade model first; batches with fewer rules than this are
+    # re-extracted with the full model (0 sends everything to the full model)
+    "CASCADE_MIN_RULES": int(os.environ.get("CASCADE_MIN_RULES", "2")),
+    # Route PDF rule extraction through the OpenAI Batch API (about half price, results within 24h)
+    "USE_BATCH_API": os.environ.get("USE_BATCH_API", "0").strip().lower() in ("1", "true", "yes"),
+    # Token cap per PDF page of extraction content (0 = no cap); truncations are logged
+    "PAGE_TOKEN_BUDGET": int(os.environ.get("PAGE_TOKEN_BUDGET", "4000")),
+    # Token cap for a whole HTML datasheet's extraction content; 0 (default) sends it all
+    "HTML_TOKEN_BUDGET": int(os.environ.get("HTML_TOKEN_BUDGET", "0")),
+    # Cosine similarity above which two extracted rules count as paraphrases; 0 disables
+    "RULE_DEDUP_SIMILARITY": float(os.environ.get("RULE_DEDUP_SIMILARITY", "0.92")),
+    "PART_CANDIDATES_TOPN": int(os.environ.get("PART_CANDIDATES_TOPN", "2000")),
+    # Use pdfplumber's cheaper extract_text_simple for PDF text; set PDF_FAST_LAYOUT=0 to revert
+    "PDF_FAST_LAYOUT": os.environ.get("PDF_FAST_LAYOUT", "1").strip().lower() not in ("0", "false", "no"),
+    # Parallel page extraction per PDF; 0 = cpu_count in a main process, serial inside a pool worker
+    "PDF_PAGE_WORKERS": int(os.environ.get("PDF_PAGE_WORKERS", "0")),
+    # Text backend for rules_retriever's PDF graph: "pdfplumber" or "pypdfium2" (faster, leaner;
+    # tables are still read with pdfplumber)
+    "PDF_BACKEND": os.environ.get("PDF_BACKEND", "pdfplumber").strip().lower(),
 }
 
 
@@ -49,6 +77,32 @@ ORG = {
 }
 
 
+def page_workers() -> int:
+    """Workers for parallel PDF page extraction: PDF_PAGE_WORKERS when set, else cpu_count.
+
+    Inside a pool worker (e.g. a rules_runner process) extraction is serial, so pools never
+    nest into workers x cpu_count processes.
+    """
+    configured = COMMON["PDF_PAGE_WORKERS"]
+    if configured > 0:
+        return configured
+    if multiprocessing.parent_process() is not None:
+        return 1
+    return os.cpu_count() or 1
+
+
+def _resolve(org: str) -> dict:
+    merged = dict(ORG["generic"])
+    merged.update(ORG.get(org, {}))
+    merged.update(COMMON)
+    return merged
+
+
+# Snapshot of every hyperparameter for the org selected at import time; hyperparameters
+# are process constants, so modules read these attributes instead of calling get() per use.
+HP = SimpleNamespace(**_resolve(current_org()))
+
+
 def get(name: str, default=None):
     org = current_org()
     if name in COMMON:
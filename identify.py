@@ -3,35 +3,104 @@
 import sys
 import re
 import json
+import heapq
+import string
+import importlib.util
+import threading
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
+from collections import Counter, OrderedDict
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor
 from bs4 import BeautifulSoup
 
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+try:
+    # The lexbor backend; selectolax.parser (Modest) was removed in selectolax 1.0
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxHTMLParser
+except ImportError:
+    SelectolaxHTMLParser = None
+
+try:
+    from .json_io import content_key, dumps, dumps_indented, load_cached, store_cached
+    from .hyperparams import HP
+except ImportError:
+    from json_io import content_key, dumps, dumps_indented, load_cached, store_cached
+    from hyperparams import HP
+
+PART_CANDIDATES_TOPN = HP.PART_CANDIDATES_TOPN
+PDF_FAST_LAYOUT = HP.PDF_FAST_LAYOUT
+SUPPORTED_SUFFIXES = {".html", ".htm", ".pdf"}
+# identify_file's cache is keyed on (path, mtime, size); results also depend on these settings
+# and on which optional backends are installed, so they are folded into the cache kind
+IDENTIFY_CACHE_SETTINGS = {
+    "pdf_fast_layout": PDF_FAST_LAYOUT,
+    "part_candidates_topn": PART_CANDIDATES_TOPN,
+    "html_parser": HTML_PARSER,
+    "selectolax": SelectolaxHTMLParser is not None,
+    "camelot": importlib.util.find_spec("camelot") is not None,
+}
+IDENTIFY_CACHE_KIND = "identify-v1-" + content_key(dumps(IDENTIFY_CACHE_SETTINGS))[:16]
+
 REJECT = {"PDF", "HTML", "UTF-8", "UTF8", "ISO-8859-1", "ASCII"}
 PROTO_REJECT = {"USB3.0", "USB3", "USB2.0", "LPDDR4", "DDR3", "DDR3L", "DDR4", "H.264", "WMV9", "ETHERNET", "CAN", "I2C", "SPI", "UART", "SD3.0", "MIPI", "PCIE", "SATA", "SD24", "MCLK", "SMCLK", "ACLK", "DVSS", "AVSS", "VREF", "VCORE", "NMI", "JTAG", "TCK", "TMS", "TDI", "TDO"}
+BLOCKED_TOKENS = frozenset(REJECT) | frozenset(PROTO_REJECT)
 SIG_RE = re.compile(r"^(UCA|USART|UART|SPI|I2C|I2S|CAN|TA|TB|TC|TIM|ADC|DAC|GPIO|PORT|P\d|SD|USB|ETH|CLK|MCLK|SMCLK|ACLK|JTAG|NMI)[A-Z0-9/._-]*$", re.I)
 TOKEN_RE = re.compile(r"\b[A-Z][A-Z0-9\-\.]{3,}\b")
+# TOKEN_RE restricted to tokens with a digit: is_part_token rejects digit-free tokens,
+# so the lookahead drops the bulk of prose words inside the regex engine.
+PART_TOKEN_RE = re.compile(r"\b(?=[A-Z][A-Z\-\.]*\d)[A-Z][A-Z0-9\-\.]{3,}\b")
 TI_LIT_RE = re.compile(r"\b(SL[A-Z]{1,2}[A-Z0-9]{3,})\b")
 LONG_UPPER_ALNUM = re.compile(r"\b[A-Z0-9]{10,}\b")
+UPPER_CHARS = frozenset(string.ascii_uppercase)
+DIGIT_CHARS = frozenset(string.digits)
+PUNCT_CHARS = frozenset("-.")
+PART_CHARS = UPPER_CHARS | DIGIT_CHARS | PUNCT_CHARS
+PATH_PART_RE = re.compile(r"^[A-Z][A-Z0-9\-\.]{3,}$")
+FAMILY_PREFIX_RE = re.compile(r"^([A-Za-z]+)")
+PDF_BODY_CHAR_BUDGET = 2_000_000
+PKG_WORDS = ("QFN", "LQFP", "TQFP", "QFP", "BGA", "FBGA", "WLCSP", "SOIC", "SSOP", "DFN", "QFPN", "QPN", "LGA")
+PKG_WORD_RES = tuple(re.compile(rf"\b{w}[0-9]*\b") for w in PKG_WORDS)
+PKG_GENERIC_RE = re.compile(r"\b([A-Z]{2,5}[0-9]{2,4})\b")
+PKG_PREFIXES = ("QF", "LQ", "TQ", "BG", "DF", "WL", "SO", "SS", "RGZ", "RGE", "ZEJ", "ZCZ", "ZFG", "ALW", "AMC")
 
 
 def is_part_token(tok: str) -> bool:
-    if tok in REJECT or tok.upper() in PROTO_REJECT:
+    # Tokens with lowercase letters fail the charset check below, so no .upper() is needed
+    if tok in BLOCKED_TOKENS:
         return False
     if not tok or len(tok) < 4 or len(tok) > 80:
         return False
-    if not tok[0].isalpha():
-        return False
-    if sum(c.isdigit() for c in tok) == 0:
+    if tok[0] not in UPPER_CHARS:
         return False
-    if re.search(r"\d+\.\d+", tok):
+    # Single pass: allowed charset, digit presence, no "1.2" floats, no 4+ punctuation runs.
+    has_digit = False
+    run = 0
+    prev = prev2 = ""
+    for c in tok:
+        if c not in PART_CHARS:
+            return False
+        if c in DIGIT_CHARS:
+            if prev == "." and prev2 in DIGIT_CHARS:
+                return False
+            has_digit = True
+            run = 0
+        elif c in PUNCT_CHARS:
+            run += 1
+            if run >= 4:
+                return False
+        else:
+            run = 0
+        prev2, prev = prev, c
+    if not has_digit:
         return False
     if SIG_RE.match(tok):
         return False
-    if re.search(r"[\.+\-_]{4,}", tok):
-        return False
-    if re.match(r"^[A-Z0-9\-\.]+$", tok) is None:
-        return False
     return True
 
 
@@ -39,31 +108,130 @@ def read_html(path: Path) -> str:
     return path.read_text(encoding="utf-8", errors="ignore")
 
 
+# Only identify followed by pin_table on the same file reuses a tree; keep few full trees alive
+@lru_cache(maxsize=2)
+def _parse_html_cached(path_str: str, mtime_ns: int, size: int) -> BeautifulSoup:
+    return BeautifulSoup(read_html(Path(path_str)), HTML_PARSER)
+
+
+def parse_html(path: Path) -> BeautifulSoup:
+    """Parse an HTML file once per (path, mtime, size); callers must not mutate the soup."""
+    st = path.stat()
+    return _parse_html_cached(str(path), st.st_mtime_ns, st.st_size)
+
+
 def extract_text_bits_html(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    return extract_text_bits_soup(BeautifulSoup(html, HTML_PARSER))
+
+
+def extract_text_bits_soup(soup: BeautifulSoup) -> dict:
     title = (soup.title.string or "").strip() if soup.title else ""
     h_texts = []
-    for tag in ["h1", "h2", "h3", "h4"]:
-        for h in soup.find_all(tag):
-            t = h.get_text(" ", strip=True)
-            if t:
-                h_texts.append(t)
+    for h in soup.find_all(["h1", "h2", "h3", "h4"]):
+        t = h.get_text(" ", strip=True)
+        if t:
+            h_texts.append(t)
     meta_names = []
-    for m in soup.find_all("meta"):
+    for m in soup.find_all("meta", limit=100):
         v = m.get("content") or m.get("name") or ""
         if v:
             meta_names.append(str(v).strip())
-    body_sample = " ".join([p.get_text(" ", strip=True) for p in soup.find_all("p")[:50]])
+    body_sample = " ".join(p.get_text(" ", strip=True) for p in soup.find_all("p", limit=50))
     return {"title": title, "headings": h_texts, "meta": meta_names, "body": body_sample, "soup": soup}
 
 
-def extract_text_bits_pdf(path: Path, max_pages: int = 10) -> dict:
+def extract_page_text(page) -> str:
+    # extract_text_simple skips extract_text's word clustering; older pdfplumber lacks it
+    simple = getattr(page, "extract_text_simple", None) if PDF_FAST_LAYOUT else None
+    if simple is not None:
+        return simple() or ""
+    return page.extract_text() or ""
+
+
+def iter_pdf_pages(pdf, with_tables: bool = False, with_text: bool = True) -> Iterator[Tuple[int, str, list]]:
+    for i, page in enumerate(pdf.pages):
+        txt = ""
+        if with_text:
+            try:
+                txt = extract_page_text(page)
+            except Exception:
+                txt = ""
+        tables: list = []
+        if with_tables:
+            try:
+                tables = page.extract_tables() or []
+            except Exception:
+                tables = []
+        yield i, txt, tables
+
+
+# (path, mtime_ns, size) -> (covers whole document, per-page pdfplumber tables), least recently
+# used first. Bounded, and locked because rules_name_fix calls in from a thread pool.
+_PDF_TABLES_CACHE: "OrderedDict[Tuple[str, int, int], Tuple[bool, List[list]]]" = OrderedDict()
+_PDF_TABLES_LOCK = threading.Lock()
+PDF_TABLES_CACHE_SIZE = 8
+
+
+def _pdf_cache_key(path: Path) -> Tuple[str, int, int]:
+    st = path.stat()
+    return str(path), st.st_mtime_ns, st.st_size
+
+
+def _cached_page_tables(key: Tuple[str, int, int], max_pages: int) -> Optional[List[list]]:
+    with _PDF_TABLES_LOCK:
+        hit = _PDF_TABLES_CACHE.get(key)
+        if hit is None:
+            return None
+        _PDF_TABLES_CACHE.move_to_end(key)
+    complete, pages = hit
+    if max_pages > 0 and (complete or len(pages) >= max_pages):
+        return pages[:max_pages]
+    if complete:
+        return pages
+    return None
+
+
+def _store_page_tables(key: Tuple[str, int, int], pages: List[list], complete: bool) -> None:
+    with _PDF_TABLES_LOCK:
+        hit = _PDF_TABLES_CACHE.get(key)
+        if hit is not None and (hit[0] or len(hit[1]) >= len(pages)):
+            return
+        _PDF_TABLES_CACHE[key] = (complete, pages)
+        _PDF_TABLES_CACHE.move_to_end(key)
+        while len(_PDF_TABLES_CACHE) > PDF_TABLES_CACHE_SIZE:
+            _PDF_TABLES_CACHE.popitem(last=False)
+
+
+def pdf_page_tables(path: Path, max_pages: int = 0) -> List[list]:
+    """pdfplumber tables for each page (all pages when max_pages <= 0).
+
+    Results are cached per (path, mtime, size) so identify and pin_table extract
+    tables from a PDF only once.
+    """
+    import pdfplumber
+    key = _pdf_cache_key(path)
+    cached = _cached_page_tables(key, max_pages)
+    if cached is not None:
+        return cached
+    pages = list(range(1, max_pages + 1)) if max_pages > 0 else None
+    with pdfplumber.open(str(path), pages=pages) as pdf:
+        page_tables = [tables for _, _, tables in iter_pdf_pages(pdf, with_tables=True, with_text=False)]
+    _store_page_tables(key, page_tables, max_pages <= 0 or len(page_tables) < max_pages)
+    return page_tables
+
+
+def extract_text_bits_pdf(path: Path, max_pages: int = 10, with_tables: bool = False) -> dict:
     import pdfplumber
     title = ""
     headings: List[str] = []
     meta: List[str] = []
     body_parts: List[str] = []
-    with pdfplumber.open(str(path)) as pdf:
+    page_tables_list: List[list] = []
+    key = _pdf_cache_key(path)
+    cached_tables = _cached_page_tables(key, max_pages) if with_tables else None
+    # Only the first max_pages pages are loaded; pdfplumber skips the rest entirely.
+    pages = list(range(1, max_pages + 1)) if max_pages > 0 else None
+    with pdfplumber.open(str(path), pages=pages) as pdf:
         try:
             docinfo = pdf.metadata or {}
         except Exception:
@@ -71,53 +239,49 @@ def extract_text_bits_pdf(path: Path, max_pages: int = 10) -> dict:
         for k, v in docinfo.items():
             if isinstance(v, str) and v:
                 meta.append(v.strip())
-        pages = pdf.pages[:max_pages]
-        for i, page in enumerate(pages):
-            try:
-                txt = page.extract_text() or ""
-            except Exception:
-                txt = ""
+        body_len = 0
+        read_all = True
+        for i, txt, page_tables in iter_pdf_pages(pdf, with_tables and cached_tables is None):
             if i == 0 and not title:
-                m = re.search(r"^[\s\S]{0,200}" , txt)
-                if m:
-                    title = m.group(0).strip()
-            for line in txt.splitlines()[:10]:
-                if 0 < len(line.strip()) < 120:
-                    headings.append(line.strip())
+                title = txt[:200].strip()
+            # Only the first 10 lines are candidate headings; don't split the rest of the page
+            for line in txt.split("\n", 10)[:10]:
+                line = line.strip()
+                if 0 < len(line) < 120:
+                    headings.append(line)
             body_parts.append(txt)
+            page_tables_list.append(page_tables)
+            body_len += len(txt)
+            if body_len >= PDF_BODY_CHAR_BUDGET:
+                read_all = False
+                break
+    if cached_tables is not None:
+        page_tables_list = cached_tables
+    elif with_tables:
+        _store_page_tables(key, page_tables_list, read_all and (max_pages <= 0 or len(page_tables_list) < max_pages))
+    tables = [t for page_tables in page_tables_list for t in page_tables]
     body = " ".join(body_parts)
-    return {"title": title, "headings": headings, "meta": meta, "body": body}
+    return {"title": title, "headings": headings, "meta": meta, "body": body, "tables": tables}
+
+
+def iter_part_tokens(text: str) -> Iterator[str]:
+    """Yield the tokens of text that pass is_part_token, in order of appearance."""
+    return filter(is_part_token, PART_TOKEN_RE.findall(text))
 
 
 def tokenize_candidates(text: str) -> list:
-    tokens = TOKEN_RE.findall(text)
-    out = []
-    for tok in tokens:
-        if is_part_token(tok):
-            out.append(tok)
-    return out
+    return list(iter_part_tokens(text))
 
 
 def score_parts(bits: dict) -> list:
-    all_text = " \n ".join([bits.get("title", ""), " \n ".join(bits.get("headings", [])), " ".join(bits.get("meta", [])), bits.get("body", "")])
     title = bits.get("title", "")
     headings = " \n ".join(bits.get("headings", []))
-    pool = tokenize_candidates(all_text)
-    if not pool:
+    all_text = " \n ".join([title, headings, " ".join(bits.get("meta", [])), bits.get("body", "")])
+    freq = Counter(tokenize_candidates(all_text))
+    if not freq:
         return []
-    freq: Dict[str, int] = {}
-    for t in pool:
-        freq[t] = freq.get(t, 0) + 1
-    scores = []
-    for t, f in freq.items():
-        s = f
-        if t in title:
-            s += 5
-        if t in headings:
-            s += 3
-        scores.append((s, t))
-    scores.sort(reverse=True)
-    return [t for _, t in scores]
+    scores = [(f + 5 * (t in title) + 3 * (t in headings), t) for t, f in freq.items()]
+    return [t for _, t in heapq.nlargest(PART_CANDIDATES_TOPN, scores)]
 
 
 def path_candidates(path: Path) -> list:
@@ -128,10 +292,10 @@ def path_candidates(path: Path) -> list:
         name = comp.name
         if not name or name in REJECT:
             continue
-        if re.match(r"^[A-Z][A-Z0-9\-\.]{3,}$", name) and any(ch.isdigit() for ch in name):
+        if PATH_PART_RE.match(name) and any(ch.isdigit() for ch in name):
             parts.append(name)
     name = path.stem
-    if re.match(r"^[A-Z][A-Z0-9\-\.]{3,}$", name) and any(ch.isdigit() for ch in name):
+    if PATH_PART_RE.match(name) and any(ch.isdigit() for ch in name):
         if name not in parts:
             parts.append(name)
     return parts
@@ -140,13 +304,10 @@ def path_candidates(path: Path) -> list:
 def find_packages(bits: dict) -> list:
     text = " \n ".join([bits.get("title", ""), " \n ".join(bits.get("headings", [])), bits.get("body", "")])
     pkgs = set()
-    pat_words = ["QFN", "LQFP", "TQFP", "QFP", "BGA", "FBGA", "WLCSP", "SOIC", "SSOP", "DFN", "QFPN", "QPN", "LGA"]
-    for w in pat_words:
-        for m in re.finditer(rf"\b{w}[0-9]*\b", text):
-            pkgs.add(m.group(0))
-    for m in re.finditer(r"\b([A-Z]{2,5}[0-9]{2,4})\b", text):
-        tok = m.group(1)
-        if any(tok.startswith(p) for p in ["QF", "LQ", "TQ", "BG", "DF", "WL", "SO", "SS", "RGZ", "RGE", "ZEJ", "ZCZ", "ZFG", "ALW", "AMC"]):
+    for r in PKG_WORD_RES:
+        pkgs.update(r.findall(text))
+    for tok in PKG_GENERIC_RE.findall(text):
+        if tok.startswith(PKG_PREFIXES):
             pkgs.add(tok)
     return sorted(pkgs)
 
@@ -155,7 +316,7 @@ ORDER_HEADER = re.compile(r"\b(order|ordering|orderable|order\s*code|order\s*num
 
 
 def part_candidates_from_html_tables(soup: BeautifulSoup) -> List[str]:
-    parts: List[str] = []
+    parts: Dict[str, None] = {}
     tables = soup.find_all("table")
     for table in tables:
         headers = []
@@ -168,15 +329,7 @@ def part_candidates_from_html_tables(soup: BeautifulSoup) -> List[str]:
             first = table.find("tr")
             if first:
                 headers = [th.get_text(" ", strip=True) for th in first.find_all(["th", "td"])]
-        cap_ok = False
-        cap = table.find("caption")
-        if cap and ORDER_HEADER.search(cap.get_text(" ", strip=True) or ""):
-            cap_ok = True
-        prev_heading = table.find_previous(["h1", "h2", "h3", "h4"]) 
-        prev_ok = bool(prev_heading and ORDER_HEADER.search(prev_heading.get_text(" ", strip=True) or ""))
         header_flags = [bool(ORDER_HEADER.search(h or "")) for h in headers]
-        if not (any(header_flags) or cap_ok or prev_ok):
-            pass
         rows = table.find_all("tr")
         for tr in rows[1:] if len(rows) > 1 else []:
             cells = [td.get_text(" ", strip=True) for td in tr.find_all(["td", "th"])]
@@ -185,14 +338,53 @@ def part_candidates_from_html_tables(soup: BeautifulSoup) -> List[str]:
                 if idx >= len(cells):
                     continue
                 cell = cells[idx]
-                for tok in TOKEN_RE.findall(cell):
-                    if is_part_token(tok) and tok not in parts:
-                        parts.append(tok)
-    return parts
+                for tok in iter_part_tokens(cell):
+                    parts[tok] = None
+    return list(parts)
+
+
+def part_candidates_from_html_text(html: str) -> List[str]:
+    """selectolax port of part_candidates_from_html_tables; cell text is read in C rather than via bs4."""
+    parts: Dict[str, None] = {}
+    tree = SelectolaxHTMLParser(html)
+    for table in tree.css("table"):
+        headers = []
+        first = table.css_first("thead tr")
+        if first is not None:
+            headers = [selectolax_text(c) for c in _cells(first)]
+        if not headers:
+            first = table.css_first("tr")
+            if first is not None:
+                headers = [selectolax_text(c) for c in _cells(first)]
+        header_flags = [bool(ORDER_HEADER.search(h or "")) for h in headers]
+        rows = table.css("tr")
+        for tr in rows[1:] if len(rows) > 1 else []:
+            cells = [selectolax_text(c) for c in _cells(tr)]
+            scan_cols = [i for i, f in enumerate(header_flags) if f] if any(header_flags) else list(range(len(cells)))
+            for idx in scan_cols:
+                if idx >= len(cells):
+                    continue
+                for tok in iter_part_tokens(cells[idx]):
+                    parts[tok] = None
+    return list(parts)
+
+
+def _cells(row) -> list:
+    return [n for n in row.traverse(include_text=False) if n.tag in ("td", "th")]
+
+
+# Separates text nodes in node.text(); cannot occur in parsed HTML text
+_TEXT_NODE_SEP = "\x00"
+
+
+def selectolax_text(node) -> str:
+    """node's text as bs4's get_text(" ", strip=True): stripped, non-empty text nodes joined by " "."""
+    parts = (part.strip() for part in node.text(deep=True, separator=_TEXT_NODE_SEP).split(_TEXT_NODE_SEP))
+    return " ".join(part for part in parts if part)
 
 
 def part_candidates_from_ordering_sections(soup: BeautifulSoup) -> List[str]:
-    parts: List[str] = []
+    parts: Dict[str, None] = {}
     heads = [h for h in soup.find_all(["h1", "h2", "h3", "h4"]) if ORDER_HEADER.search(h.get_text(" ", strip=True) or "")]
     for h in heads:
         cur = h
@@ -203,18 +395,40 @@ def part_candidates_from_ordering_sections(soup: BeautifulSoup) -> List[str]:
             if not cur or isinstance(cur, str):
                 continue
             text = cur.get_text(" ", strip=True)
-            for tok in TOKEN_RE.findall(text):
-                if is_part_token(tok) and tok not in parts:
-                    parts.append(tok)
-    return parts
+            for tok in iter_part_tokens(text):
+                parts[tok] = None
+    return list(parts)
+
+
+def part_candidates_from_table_rows(table: List[List[str]], parts: Dict[str, None]) -> None:
+    if not table:
+        return
+    headers = [str(x) for x in table[0]]
+    header_flags = [bool(ORDER_HEADER.search(h or "")) for h in headers]
+    target_cols = [i for i, f in enumerate(header_flags) if f] if any(header_flags) else list(range(len(headers)))
+    for row in table[1:]:
+        for idx in target_cols:
+            if idx >= len(row):
+                continue
+            val = str(row[idx])
+            for tok in iter_part_tokens(val):
+                parts[tok] = None
+
+
+def part_candidates_from_pdfplumber_tables(tables: list) -> List[str]:
+    parts: Dict[str, None] = {}
+    for table in tables:
+        rows = [["" if c is None else c for c in row] for row in table if row]
+        part_candidates_from_table_rows(rows, parts)
+    return list(parts)
 
 
 def part_candidates_from_pdf_tables(path: Path, max_pages: int = 10) -> List[str]:
-    parts: List[str] = []
+    parts: Dict[str, None] = {}
     try:
         import camelot
     except Exception:
-        return parts
+        return []
     for flavor in ("lattice", "stream"):
         try:
             tables = camelot.read_pdf(str(path), pages=f"1-{max_pages}", flavor=flavor)
@@ -227,96 +441,108 @@ def part_candidates_from_pdf_tables(path: Path, max_pages: int = 10) -> List[str
                 continue
             if df.shape[0] == 0:
                 continue
-            headers = [str(x) for x in list(df.iloc[0, :])]
-            header_flags = [bool(ORDER_HEADER.search(h or "")) for h in headers]
-            target_cols = [i for i, f in enumerate(header_flags) if f] if any(header_flags) else list(range(df.shape[1]))
-            for _, row in df.iloc[1:, :].iterrows():
-                for idx in target_cols:
-                    if idx >= len(row):
-                        continue
-                    val = str(row.iloc[idx])
-                    for tok in TOKEN_RE.findall(val):
-                        if is_part_token(tok) and tok not in parts:
-                            parts.append(tok)
-    return parts
+            part_candidates_from_table_rows(df.values.tolist(), parts)
+    return list(parts)
 
 
 def derive_family_prefix(primary_candidates: List[str]) -> Optional[str]:
     if not primary_candidates:
         return None
     base = primary_candidates[0]
-    m = re.match(r"^([A-Za-z]+)", base)
+    m = FAMILY_PREFIX_RE.match(base)
     if not m:
         return None
     return m.group(1).upper()
 
 
 def extract_vendor_codes_text(text: str) -> List[str]:
-    out: List[str] = []
-    for m in TI_LIT_RE.finditer(text):
-        code = m.group(1)
-        if code not in out:
-            out.append(code)
+    out: Dict[str, None] = dict.fromkeys(TI_LIT_RE.findall(text))
     # concatenated/vendor keys
-    for m in LONG_UPPER_ALNUM.finditer(text):
-        tok = m.group(0)
+    for tok in LONG_UPPER_ALNUM.findall(text):
         if any(c.isdigit() for c in tok) and any(c.isalpha() for c in tok):
-            if tok not in out:
-                out.append(tok)
-    return out
+            out[tok] = None
+    return list(out)
 
 
-def identify_file(path: Path) -> dict:
+def identify_file(path: Path, use_cache: bool = True) -> dict:
+    """Identify the device in path; results are cached on disk by (path, mtime, size)."""
+    if use_cache and path.suffix.lower() in SUPPORTED_SUFFIXES:
+        cached = load_cached(IDENTIFY_CACHE_KIND, path)
+        if cached is not None:
+            return cached
+    result = _identify_file(path)
+    if use_cache and "error" not in result:
+        store_cached(IDENTIFY_CACHE_KIND, path, result)
+    return result
+
+
+def _identify_file(path: Path) -> dict:
     if path.suffix.lower() in {".html", ".htm"}:
-        bits = extract_text_bits_html(read_html(path))
-        table_parts = part_candidates_from_html_tables(bits.get("soup"))
+        bits = extract_text_bits_soup(parse_html(path))
+        if SelectolaxHTMLParser is not None:
+            table_parts = part_candidates_from_html_text(read_html(path))
+        else:
+            table_parts = part_candidates_from_html_tables(bits.get("soup"))
         sec_parts = part_candidates_from_ordering_sections(bits.get("soup"))
         vendor_codes = extract_vendor_codes_text(" \n ".join([bits.get("title","")," \n ".join(bits.get("headings",[])),bits.get("body","")]))
         table_parts = list(dict.fromkeys(table_parts + sec_parts + vendor_codes))
     elif path.suffix.lower() == ".pdf":
-        bits = extract_text_bits_pdf(path)
-        table_parts = part_candidates_from_pdf_tables(path)
+        bits = extract_text_bits_pdf(path, with_tables=True)
+        # Tables come from the same pdfplumber pass as the text (or from pin_table's
+        # cached pass); camelot only re-reads the PDF when pdfplumber found no tables.
+        if bits.get("tables"):
+            table_parts = part_candidates_from_pdfplumber_tables(bits["tables"])
+        else:
+            table_parts = part_candidates_from_pdf_tables(path)
         vendor_codes = extract_vendor_codes_text(" \n ".join([bits.get("title","")," \n ".join(bits.get("headings",[])),bits.get("body","")]))
         table_parts = list(dict.fromkeys(table_parts + vendor_codes))
     else:
         return {"file": str(path), "error": "unsupported"}
     parts_path = path_candidates(path)
     parts_text = score_parts(bits)
-    merged: List[str] = []
-    for t in parts_path + table_parts + parts_text:
-        if t not in merged:
-            merged.append(t)
+    merged = list(dict.fromkeys(parts_path + table_parts + parts_text))
     primary = merged[0] if merged else None
     packages = find_packages(bits)
     return {
         "file": str(path),
         "device_name": primary,
-        "part_candidates": merged[:2000],
+        "part_candidates": merged[:PART_CANDIDATES_TOPN],
         "packages": packages[:20],
     }
 
 
+USAGE = "usage: identify.py [--no-cache] <file> | --batch <folder> [--jobs N]"
+
+
 def main():
-    if len(sys.argv) == 2 and sys.argv[1] not in ("--batch",):
-        p = Path(sys.argv[1])
+    use_cache = "--no-cache" not in sys.argv
+    argv = [a for a in sys.argv if a != "--no-cache"]
+    if len(argv) == 2 and argv[1] not in ("--batch",):
+        p = Path(argv[1])
         if not p.exists():
             print(json.dumps({"error": "file not found"}))
             sys.exit(2)
-        result = identify_file(p)
-        print(json.dumps(result, indent=2))
+        result = identify_file(p, use_cache)
+        print(dumps_indented(result).decode("utf-8"))
         return
-    if len(sys.argv) == 3 and sys.argv[1] == "--batch":
-        src = Path(sys.argv[2])
+    if len(argv) in (3, 5) and argv[1] == "--batch":
+        jobs = None
+        if len(argv) == 5:
+            if argv[3] != "--jobs" or not argv[4].isdigit() or int(argv[4]) < 1:
+                print(json.dumps({"error": USAGE}))
+                sys.exit(1)
+            jobs = int(argv[4])
+        src = Path(argv[2])
         out = src / "output"
         out.mkdir(parents=True, exist_ok=True)
         files = [*src.glob("*.html"), *src.glob("*.htm"), *src.glob("*.pdf")]
-        for f in files:
-            res = identify_file(f)
-            out_path = out / (f.name + ".json")
-            out_path.write_text(json.dumps(res, indent=2), encoding="utf-8")
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for f, res in zip(files, executor.map(partial(identify_file, use_cache=use_cache), files, chunksize=4)):
+                out_path = out / (f.name + ".json")
+                out_path.write_bytes(dumps_indented(res))
         print(json.dumps({"processed": len(files), "out": str(out)}))
         return
-    print(json.dumps({"error": "usage: identify.py <file> | --batch <folder>"}))
+    print(json.dumps({"error": USAGE}))
     sys.exit(1)
 
 
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_indented(obj: Any) -> bytes:
+    """Serialize obj as 2-space indented UTF-8 JSON, via orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize obj as compact UTF-8 JSON, via orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+CACHE_DIR = Path(os.environ.get("NOAM_SCHEMSKY_CACHE_DIR") or Path.home() / ".cache" / "noam-schemsky")
+
+
+def file_cache_path(kind: str, path: Path) -> Path:
+    """Cache location for a result derived from path, keyed on its (path, mtime, size)."""
+    st = path.stat()
+    key = hashlib.sha1(f"{path.resolve()}|{st.st_mtime_ns}|{st.st_size}".encode("utf-8")).hexdigest()
+    return CACHE_DIR / kind / f"{key}.json"
+
+
+def content_key(*parts: bytes) -> str:
+    """sha256 over length-prefixed parts, so distinct part lists never collide."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    return h.hexdigest()
+
+
+def load_cached(kind: str, path: Path) -> Optional[Any]:
+    try:
+        return loads(file_cache_path(kind, path).read_bytes())
+    except Exception:
+        return None
+
+
+def store_cached(kind: str, path: Path, value: Any) -> None:
+    try:
+        _store(file_cache_path(kind, path), value)
+    except Exception:
+        pass
+
+
+def load_keyed(kind: str, key: str) -> Optional[Any]:
+    """Content-addressed counterpart of load_cached; key is typically a content_key()."""
+    try:
+        return loads((CACHE_DIR / kind / f"{key}.json").read_bytes())
+    except Exception:
+        return None
+
+
+def store_keyed(kind: str, key: str, value: Any) -> None:
+    try:
+        _store(CACHE_DIR / kind / f"{key}.json", value)
+    except Exception:
+        pass
+
+
+def _store(cache_path: Path, value: Any) -> None:
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write-then-rename so concurrent workers never read a partial file; the temp file is unique
+    # per call, so threads of one process writing the same key don't share it either
+    with tempfile.NamedTemporaryFile(dir=cache_path.parent, suffix=".tmp", delete=False) as tmp:
+        tmp.write(dumps_indented(value))
+    try:
+        os.replace(tmp.name, cache_path)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from typing import Any, Mapping
+
+from openai import AsyncOpenAI
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count of text; ~4 characters per token when tiktoken is unavailable."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def retry_after(error: Any, default: float) -> float:
+    """Seconds to wait from an API error's Retry-After header, else default."""
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return default
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """text cut to at most max_tokens tokens (by the same measure as estimate_tokens)."""
+    if _ENCODING is not None:
+        tokens = _ENCODING.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else _ENCODING.decode(tokens[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+class OpenAIRateLimiter:
+    """Token-bucket gate in front of an AsyncOpenAI client.
+
+    Request and token buckets refill continuously from the per-minute quotas. Each call
+    reserves its estimated cost (prompt tokens + max_completion_tokens, as OpenAI counts
+    it) before dispatch, and the buckets are clamped to the x-ratelimit-remaining-*
+    headers of every response, so requests wait locally instead of drawing 429s.
+    Must be created inside the event loop that uses it.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        max_requests_per_minute: int,
+        max_tokens_per_minute: int,
+        max_concurrency: int,
+    ):
+        self.client = client
+        self.max_requests = float(max_requests_per_minute)
+        self.max_tokens = float(max_tokens_per_minute)
+        self.available_requests = self.max_requests
+        self.available_tokens = self.max_tokens
+        self.last_refill = time.monotonic()
+        self.lock = asyncio.Lock()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        self.available_requests = min(self.max_requests, self.available_requests + elapsed * self.max_requests / 60.0)
+        self.available_tokens = min(self.max_tokens, self.available_tokens + elapsed * self.max_tokens / 60.0)
+
+    async def acquire(self, tokens: int) -> None:
+        # A single request larger than the whole quota only waits for a full bucket
+        tokens = min(float(tokens), self.max_tokens)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.available_requests >= 1 and self.available_tokens >= tokens:
+                    self.available_requests -= 1
+                    self.available_tokens -= tokens
+                    return
+                wait = max(
+                    (1 - self.available_requests) * 60.0 / self.max_requests,
+                    (tokens - self.available_tokens) * 60.0 / self.max_tokens,
+                    0.05,
+                )
+                await asyncio.sleep(wait)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        for header, attr in (
+            ("x-ratelimit-remaining-requests", "available_requests"),
+            ("x-ratelimit-remaining-tokens", "available_tokens"),
+        ):
+            try:
+                remaining = float(headers.get(header))
+            except (TypeError, ValueError):
+                continue
+            setattr(self, attr, min(getattr(self, attr), remaining))
+
+    async def parse(self, **kwargs: Any) -> Any:
+        """Rate-limited client.beta.chat.completions.parse(**kwargs)."""
+        return await self._call(self.client.beta.chat.completions.with_raw_response.parse, kwargs)
+
+    async def create(self, **kwargs: Any) -> Any:
+        """Rate-limited client.chat.completions.create(**kwargs)."""
+        return await self._call(self.client.chat.completions.with_raw_response.create, kwargs)
+
+    async def _call(self, method: Any, kwargs: Mapping[str, Any]) -> Any:
+        prompt = "".join(str(m.get("content", "")) for m in kwargs.get("messages", []))
+        await self.acquire(estimate_tokens(prompt) + int(kwargs.get("max_completion_tokens") or 0))
+        async with self.semaphore:
+            raw = await method(**kwargs)
+        self.update_from_headers(raw.headers)
+        return raw.parse()
@@ -0,0 +1,52 @@
+import time
+from typing import Any, Dict, Optional
+
+from openai import OpenAI
+
+try:
+    from .json_io import dumps as json_dumps, loads as json_loads
+except ImportError:
+    from json_io import dumps as json_dumps, loads as json_loads
+
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_POLL_SECONDS = 30
+BATCH_PENDING_STATUSES = ("validating", "in_progress", "finalizing")
+
+
+def run_batch(client: OpenAI, bodies: Dict[str, Dict[str, Any]], poll_seconds: float = BATCH_POLL_SECONDS) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Run chat-completion request bodies through the OpenAI Batch API and wait for the results.
+
+    bodies maps custom_id -> request body. Returns custom_id -> completion body, with None for
+    requests that failed or did not finish inside the batch's completion window.
+    """
+    results: Dict[str, Optional[Dict[str, Any]]] = dict.fromkeys(bodies)
+    if not bodies:
+        return results
+
+    lines = b"\n".join(
+        json_dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body})
+        for custom_id, body in bodies.items()
+    )
+    input_file = client.files.create(file=("requests.jsonl", lines), purpose="batch")
+    batch = client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window="24h")
+    print(f"Submitted batch {batch.id} with {len(bodies)} requests")
+
+    while batch.status in BATCH_PENDING_STATUSES:
+        time.sleep(poll_seconds)
+        batch = client.batches.retrieve(batch.id)
+
+    if batch.status != "completed":
+        print(f"Batch {batch.id} ended with status {batch.status}")
+    if batch.output_file_id:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            item = json_loads(line)
+            response = item.get("response") or {}
+            if response.get("status_code") == 200 and item.get("custom_id") in results:
+                results[item["custom_id"]] = response.get("body")
+    failed = sum(body is None for body in results.values())
+    if failed:
+        print(f"Batch {batch.id}: {failed} of {len(bodies)} requests returned no result")
+    return results
@@ -8,14 +8,29 @@ from pathlib import Path
 from typing import List, Dict
 
 from bs4 import BeautifulSoup
-import pdfplumber
+
+try:
+    from .identify import HTML_PARSER, parse_html, pdf_page_tables
+    from .json_io import dumps_indented, load_cached, store_cached
+except ImportError:
+    from identify import HTML_PARSER, parse_html, pdf_page_tables
+    from json_io import dumps_indented, load_cached, store_cached
 
 CANONICAL_HEADERS = [
     "Pin Number", "Pin Name", "Signal Name", "Direction", "Type", "Description"
 ]
 
+STRONG_KEYWORDS = ("pin", "ball", "terminal")
+MODERATE_KEYWORDS = ("signal", "function", "description", "type", "direction", "name")
+ELECTRICAL_KEYWORDS = ("min", "max", "typical", "units", "conditions", "parameter")
+SUPPLY_PIN_NAMES = frozenset(("VDD", "VSS", "GND", "VCC", "NC", "AVDD", "DVDD"))
+BALL_REF_RE = re.compile(r'^[A-Z]\d+$')
+PIN_TABLE_CACHE_KIND = "pin-table-v1"
+
 def extract_html_tables(html: str) -> List[List[List[str]]]:
-    soup = BeautifulSoup(html, "html.parser")
+    return extract_soup_tables(BeautifulSoup(html, HTML_PARSER))
+
+def extract_soup_tables(soup: BeautifulSoup) -> List[List[List[str]]]:
     tables = []
     
     for table in soup.find_all("table"):
@@ -40,39 +55,37 @@ def extract_pdf_tables(pdf_path: Path) -> List[List[List[str]]]:
     tables = []
     
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                try:
-                    page_tables = page.extract_tables()
-                    if page_tables:
-                        for table in page_tables:
-                            if table and len(table) >= 3:
-                                clean_table = []
-                                for row in table:
-                                    if row:
-                                        clean_row = []
-                                        for cell in row:
-                                            if cell is None:
-                                                clean_row.append("")
-                                            else:
-                                                cell_text = str(cell).strip()
-                                                cell_text = ' '.join(cell_text.split())
-                                                clean_row.append(cell_text)
-                                        
-                                        if sum(1 for c in clean_row if c.strip()) >= 2:
-                                            clean_table.append(clean_row)
-                                
-                                if len(clean_table) >= 3:
-                                    max_cols = max(len(row) for row in clean_table)
-                                    if max_cols >= 3:
-                                        normalized_table = []
-                                        for row in clean_table:
-                                            while len(row) < max_cols:
-                                                row.append("")
-                                            normalized_table.append(row[:max_cols])
-                                        tables.append(normalized_table)
-                except Exception:
-                    continue
+        for page_tables in pdf_page_tables(Path(pdf_path)):
+            try:
+                if page_tables:
+                    for table in page_tables:
+                        if table and len(table) >= 3:
+                            clean_table = []
+                            for row in table:
+                                if row:
+                                    clean_row = []
+                                    for cell in row:
+                                        if cell is None:
+                                            clean_row.append("")
+                                        else:
+                                            cell_text = str(cell).strip()
+                                            cell_text = ' '.join(cell_text.split())
+                                            clean_row.append(cell_text)
+                                    
+                                    if sum(1 for c in clean_row if c.strip()) >= 2:
+                                        clean_table.append(clean_row)
+                            
+                            if len(clean_table) >= 3:
+                                max_cols = max(len(row) for row in clean_table)
+                                if max_cols >= 3:
+                                    normalized_table = []
+                                    for row in clean_table:
+                                        while len(row) < max_cols:
+                                            row.append("")
+                                        normalized_table.append(row[:max_cols])
+                                    tables.append(normalized_table)
+            except Exception:
+                continue
     except Exception:
         pass
     
@@ -85,32 +98,26 @@ def score_table_for_pins(table: List[List[str]]) -> int:
     headers = [h.lower() for h in table[0]]
     score = 0
     
-    strong_keywords = ["pin", "ball", "terminal"]
-    moderate_keywords = ["signal", "function", "description", "type", "direction", "name"]
-    
     for header in headers:
-        for keyword in strong_keywords:
-            if keyword in header:
-                score += 20
-        for keyword in moderate_keywords:
-            if keyword in header:
-                score += 10
-    
-    first_col_data = [row[0].strip() for row in table[1:] if row and row[0].strip()]
-    pin_like_count = 0
+        score += 20 * sum(1 for keyword in STRONG_KEYWORDS if keyword in header)
+        score += 10 * sum(1 for keyword in MODERATE_KEYWORDS if keyword in header)
     
-    for cell in first_col_data[:10]:
-        if cell.isdigit():
-            pin_like_count += 1
-        elif re.match(r'^[A-Z]\d+$', cell):
-            pin_like_count += 1
-        elif cell.upper() in ['VDD', 'VSS', 'GND', 'VCC', 'NC', 'AVDD', 'DVDD']:
+    # Only the first 10 non-empty first-column cells are inspected
+    pin_like_count = 0
+    checked = 0
+    for row in table[1:]:
+        cell = row[0].strip() if row else ""
+        if not cell:
+            continue
+        if cell.isdigit() or BALL_REF_RE.match(cell) or cell.upper() in SUPPLY_PIN_NAMES:
             pin_like_count += 1
+        checked += 1
+        if checked == 10:
+            break
     
     score += pin_like_count * 8
     
-    electrical_keywords = ["min", "max", "typical", "units", "conditions", "parameter"]
-    electrical_count = sum(1 for h in headers for kw in electrical_keywords if kw in h)
+    electrical_count = sum(1 for h in headers for kw in ELECTRICAL_KEYWORDS if kw in h)
     if electrical_count >= 2:
         score -= 30
     
@@ -128,11 +135,12 @@ def select_best_table(tables: List[List[List[str]]]) -> List[List[str]]:
     if not tables:
         return [CANONICAL_HEADERS]
     
-    scored = [(score_table_for_pins(table), table) for table in tables]
-    scored.sort(key=lambda x: x[0], reverse=True)
+    best_score, best_table = max(
+        ((score_table_for_pins(table), table) for table in tables), key=lambda x: x[0]
+    )
     
-    if scored and scored[0][0] > 0:
-        return scored[0][1]
+    if best_score > 0:
+        return best_table
     
     return [CANONICAL_HEADERS]
 
@@ -163,10 +171,21 @@ def normalize_table_headers(table: List[List[str]]) -> List[List[str]]:
     
     return [normalized_headers] + table[1:]
 
-def extract_pin_tables(path: Path) -> Dict[str, List[List[str]]]:
+def extract_pin_tables(path: Path, use_cache: bool = True) -> Dict[str, List[List[str]]]:
+    """Best pin table for path; results are cached on disk by (path, mtime, size)."""
+    supported = path.suffix.lower() in {".html", ".htm", ".pdf"}
+    if use_cache and supported:
+        cached = load_cached(PIN_TABLE_CACHE_KIND, path)
+        if cached is not None:
+            return cached
+    result = _extract_pin_tables(path)
+    if use_cache and supported:
+        store_cached(PIN_TABLE_CACHE_KIND, path, result)
+    return result
+
+def _extract_pin_tables(path: Path) -> Dict[str, List[List[str]]]:
     if path.suffix.lower() in {".html", ".htm"}:
-        html = path.read_text(encoding="utf-8", errors="ignore")
-        tables = extract_html_tables(html)
+        tables = extract_soup_tables(parse_html(path))
     elif path.suffix.lower() == ".pdf":
         tables = extract_pdf_tables(path)
     else:
@@ -179,17 +198,19 @@ def extract_pin_tables(path: Path) -> Dict[str, List[List[str]]]:
     return {"DEFAULT_PACKAGE": normalized_table}
 
 def main():
-    if len(sys.argv) != 2:
-        print(json.dumps({"error": "usage: pin_table.py <file.html|file.pdf>"}))
+    use_cache = "--no-cache" not in sys.argv
+    argv = [a for a in sys.argv if a != "--no-cache"]
+    if len(argv) != 2:
+        print(json.dumps({"error": "usage: pin_table.py [--no-cache] <file.html|file.pdf>"}))
         sys.exit(1)
     
-    p = Path(sys.argv[1])
+    p = Path(argv[1])
     if not p.exists():
         print(json.dumps({"error": "file not found"}))
         sys.exit(2)
     
-    result = extract_pin_tables(p)
-    print(json.dumps(result, indent=2))
+    result = extract_pin_tables(p, use_cache)
+    print(dumps_indented(result).decode("utf-8"))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 
 import os
+import re
 import json
 import argparse
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, List, Set, Tuple
 
@@ -10,15 +12,39 @@ from dotenv import load_dotenv
 from openai import OpenAI
 from pydantic import BaseModel
 
+try:
+    from .json_io import dumps_indented, loads as json_loads
+    from .hyperparams import HP
+except ImportError:
+    from json_io import dumps_indented, loads as json_loads
+    from hyperparams import HP
+
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 
+RULES_PER_REQUEST = 25
+PIN_TABLE_TOPN = HP.PIN_TABLE_TOPN
+PROMPT_COLUMN_KEYWORDS = ("signal", "type", "direction", "description")
+PIN_KEY_SPLIT_RE = re.compile(r"[\s/,]+")
+RULE_WORD_RE = re.compile(r"[a-z0-9_#+\-]+")
+RULE_PIN_NUMBER_RE = re.compile(r"pins?\s*#?\s*(\d+)")
+
+
 class PinsResponse(BaseModel):
     pins: List[str]
 
 
+class RulePins(BaseModel):
+    rule_index: int
+    pins: List[str]
+
+
+class RulePinsBatch(BaseModel):
+    items: List[RulePins]
+
+
 def normalize_pin_table(pin_table: List[List[str]]) -> Tuple[Set[str], Set[str], Dict[str, str]]:
     """Extract allowed pin names and numbers from the pin table.
 
@@ -50,19 +76,86 @@ def normalize_pin_table(pin_table: List[List[str]]) -> Tuple[Set[str], Set[str],
     return allowed_pin_names, allowed_pin_numbers, number_to_name
 
 
-def build_rule_prompt(rule_text: str, pin_table: List[List[str]]) -> str:
-    """Build the prompt for selecting associated pins for a given rule."""
-    lines: List[str] = []
-    header = pin_table[0] if pin_table else []
-    header_str = ", ".join([str(h).strip() for h in header]) if header else "Pin, Name, Type, Description"
-    lines.append(f"Pin table columns: {header_str}")
+@dataclass(frozen=True)
+class PinValidators:
+    """Lookup structures for validating model-returned pins, built once per pin table."""
+    allowed_names: Set[str]
+    allowed_numbers: Set[str]
+    number_to_name: Dict[str, str]
+    name_to_canonical: Dict[str, str]
+
+
+def build_validators(pin_table: List[List[str]]) -> PinValidators:
+    """Precompute the pin validation lookups for a pin table."""
+    allowed_names, allowed_numbers, number_to_name = normalize_pin_table(pin_table)
 
-    # Include the full pin table with all columns
+    # Build a mapping from lowercased name to canonical name to preserve original casing
+    name_to_canonical: Dict[str, str] = {}
     for row in pin_table[1:]:
-        parts = [str(c).strip() for c in row]
-        lines.append(" | ".join(parts))
+        if len(row) > 1 and str(row[1]).strip():
+            original = str(row[1]).strip()
+            name_to_canonical[original.lower()] = original
+
+    return PinValidators(allowed_names, allowed_numbers, number_to_name, name_to_canonical)
 
-    table_block = "\n".join(lines)
+
+@dataclass(frozen=True)
+class PinTableRows:
+    """Pin table projected to the prompt columns, rendered once per file."""
+    header_line: str
+    rows: List[Tuple[frozenset, str]]  # (lowercased pin name/ref keys, rendered row)
+
+
+def render_pin_table(pin_table: List[List[str]]) -> PinTableRows:
+    """Project the pin table to number, name, signal, type/direction and description columns and render each row."""
+    header = pin_table[0] if pin_table else []
+    keep = [i for i, h in enumerate(header) if i < 2 or any(k in str(h).lower() for k in PROMPT_COLUMN_KEYWORDS)]
+    header_str = ", ".join([str(header[i]).strip() for i in keep]) if header else "Pin, Name, Type, Description"
+
+    rows: List[Tuple[frozenset, str]] = []
+    for row in pin_table[1:]:
+        if header:
+            parts = [str(row[i]).strip() if i < len(row) else "" for i in keep]
+        else:
+            parts = [str(c).strip() for c in row]
+        keys = set()
+        if len(row) > 1:
+            keys.update(k for k in PIN_KEY_SPLIT_RE.split(str(row[1]).strip().lower()) if k)
+        if row:
+            # Plain numeric pin numbers would match every value in the rule text,
+            # so they only match an explicit "pin 12" / "pins #3" mention
+            pin_number = str(row[0]).strip().lower()
+            if pin_number.isdigit():
+                keys.add(f"pin:{int(pin_number)}")
+            elif pin_number:
+                keys.add(pin_number)
+        rows.append((frozenset(keys), " | ".join(parts)))
+
+    return PinTableRows(f"Pin table columns: {header_str}", rows)
+
+
+def build_table_block(table: PinTableRows, rule_texts: List[str], max_rows: int = PIN_TABLE_TOPN) -> str:
+    """Render at most max_rows pin rows for a prompt, keeping every row a rule mentions by name or pin number."""
+    rows = table.rows
+    if len(rows) <= max_rows:
+        lines = [line for _, line in rows]
+    else:
+        rule_text = " ".join(rule_texts).lower()
+        words = set(RULE_WORD_RE.findall(rule_text))
+        words.update(f"pin:{int(n)}" for n in RULE_PIN_NUMBER_RE.findall(rule_text))
+        chosen = {i for i, (keys, _) in enumerate(rows) if keys & words}
+        for i in range(len(rows)):
+            if len(chosen) >= max_rows:
+                break
+            chosen.add(i)
+        lines = [rows[i][1] for i in sorted(chosen)]
+        if len(rows) > len(chosen):
+            lines.append(f"... truncated - {len(rows) - len(chosen)} more rows")
+    return "\n".join([table.header_line] + lines)
+
+
+def build_rule_prompt(rule_text: str, table_block: str) -> str:
+    """Build the prompt for selecting associated pins for a given rule."""
 
     prompt = f"""
 You are an expert hardware design engineer. Given a design rule and the device pin table, identify which pins from the pin table are directly relevant to implementing or verifying the rule.
@@ -80,10 +173,60 @@ Provide the result as a list of pin names in the exact structured format request
     return prompt
 
 
-def select_pins_for_rule(client: OpenAI, rule_text: str, pin_table: List[List[str]]) -> List[str]:
-    """Use LLM to select pins associated with a rule, then validate against the pin table."""
+def build_rules_batch_prompt(rule_texts: List[str], table_block: str) -> str:
+    """Build one prompt selecting pins for several rules against a single copy of the pin table."""
+    rules_block = "\n".join(f"{i}. {text}" for i, text in enumerate(rule_texts))
+
+    prompt = f"""
+You are an expert hardware design engineer. Given a numbered list of design rules and the device pin table, identify for each rule which pins from the pin table are directly relevant to implementing or verifying that rule.
+
+Return only the pin names from the pin table's Name column. If a rule refers to a pin by number, map it to the corresponding pin name. If no pins are relevant to a rule, return an empty list for it. Do not invent pins that are not present in the pin table.
+
+Return exactly one item per rule, with rule_index set to the rule's number from the list below.
+
+RULES:
+{rules_block}
+
+PIN TABLE (first rows):
+{table_block}
+
+Provide the result as a list of items in the exact structured format requested.
+"""
+    return prompt
+
+
+def validate_pins(model_pins: List[str], validators: PinValidators) -> List[str]:
+    """Map model-returned pins to exact pin-table names, dropping anything not in the table."""
+    normalized: List[str] = []
+    seen: Set[str] = set()
+
+    for raw_pin in model_pins:
+        candidate = str(raw_pin).strip()
+        candidate_lower = candidate.lower()
+
+        canonical_name: str = ""
+        if candidate_lower in validators.allowed_names:
+            canonical_name = validators.name_to_canonical.get(candidate_lower, candidate)
+        elif candidate_lower in validators.allowed_numbers:
+            # Map number to its pin name if available
+            mapped_name = validators.number_to_name.get(candidate_lower)
+            if mapped_name:
+                canonical_name = mapped_name
+
+        if canonical_name and canonical_name not in seen:
+            seen.add(canonical_name)
+            normalized.append(canonical_name)
+
+    return normalized
+
+
+def select_pins_for_rule(client: OpenAI, rule_text: str, table_block: str, validators: PinValidators) -> List[str]:
+    """Use LLM to select pins associated with a rule, then validate against the pin table.
+
+    table_block comes from build_table_block and validators from build_validators.
+    """
     try:
-        prompt = build_rule_prompt(rule_text, pin_table)
+        prompt = build_rule_prompt(rule_text, table_block)
         completion = client.beta.chat.completions.parse(
             model="gpt-4o",
             messages=[
@@ -104,47 +247,48 @@ def select_pins_for_rule(client: OpenAI, rule_text: str, pin_table: List[List[st
         print(f"LLM error while selecting pins: {exc}")
         model_pins = []
 
-    # Validate and normalize pins to exact names from the pin table
-    allowed_names, allowed_numbers, number_to_name = normalize_pin_table(pin_table)
+    return validate_pins(model_pins, validators)
 
-    # Build name set (lowercased) for quick membership
-    name_set_lower = allowed_names
-    number_set_lower = allowed_numbers
 
-    normalized: List[str] = []
-    seen: Set[str] = set()
-
-    # Build a mapping from lowercased name to canonical name to preserve original casing
-    name_to_canonical: Dict[str, str] = {}
-    for row in pin_table[1:]:
-        if len(row) > 1 and str(row[1]).strip():
-            original = str(row[1]).strip()
-            name_to_canonical[original.lower()] = original
-
-    for raw_pin in model_pins:
-        candidate = str(raw_pin).strip()
-        candidate_lower = candidate.lower()
-
-        canonical_name: str = ""
-        if candidate_lower in name_set_lower:
-            canonical_name = name_to_canonical.get(candidate_lower, candidate)
-        elif candidate_lower in number_set_lower:
-            # Map number to its pin name if available
-            mapped_name = number_to_name.get(candidate_lower)
-            if mapped_name:
-                canonical_name = mapped_name
+def select_pins_for_rules(
+    client: OpenAI, rule_texts: List[str], table_block: str, validators: PinValidators
+) -> List[List[str]]:
+    """Select pins for several rules in one LLM call; result i holds the validated pins for rule_texts[i]."""
+    if not rule_texts:
+        return []
+    try:
+        prompt = build_rules_batch_prompt(rule_texts, table_block)
+        completion = client.beta.chat.completions.parse(
+            model="gpt-4o",
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are an expert hardware design engineer mapping rules to valid pins from a given pin table.",
+                },
+                {"role": "user", "content": prompt},
+            ],
+            response_format=RulePinsBatch,
+            max_completion_tokens=400 * len(rule_texts),
+        )
 
-        if canonical_name and canonical_name not in seen:
-            seen.add(canonical_name)
-            normalized.append(canonical_name)
+        parsed = completion.choices[0].message.parsed if completion.choices else None
+        items: List[RulePins] = parsed.items if parsed else []
+    except Exception as exc:
+        # On any API or parsing error, return empty
+        print(f"LLM error while selecting pins: {exc}")
+        items = []
 
-    return normalized
+    by_index: Dict[int, List[str]] = {}
+    for item in items:
+        if 0 <= item.rule_index < len(rule_texts):
+            by_index.setdefault(item.rule_index, item.pins)
+    return [validate_pins(by_index.get(i, []), validators) for i in range(len(rule_texts))]
 
 
 def process_file(json_path: Path, client: OpenAI) -> Dict[str, Any]:
     """Process a single JSON file, adding a pins list to each rule."""
     try:
-        data = json.loads(json_path.read_text(encoding="utf-8"))
+        data = json_loads(json_path.read_bytes())
     except Exception as exc:
         return {"file": json_path.name, "status": "error", "error": f"read failed: {exc}"}
 
@@ -160,19 +304,31 @@ def process_file(json_path: Path, client: OpenAI) -> Dict[str, Any]:
     if not isinstance(pin_table, list) or not isinstance(rules, list):
         return {"file": json_path.name, "status": "error", "error": "missing pin/checklist fields"}
 
-    updated = 0
+    pending: List[Tuple[Dict[str, Any], str]] = []
     for rule in rules:
         rule_text = str(rule.get("rule", "")).strip()
         if not rule_text:
             rule["pins"] = []
             continue
-        pins = select_pins_for_rule(client, rule_text, pin_table)
-        rule["pins"] = pins
-        updated += 1
+        pending.append((rule, rule_text))
+
+    # Pin table is constant for the file: render and index it once
+    table_rows = render_pin_table(pin_table)
+    validators = build_validators(pin_table)
+
+    # One LLM call per RULES_PER_REQUEST rules instead of one per rule
+    for start in range(0, len(pending), RULES_PER_REQUEST):
+        chunk = pending[start:start + RULES_PER_REQUEST]
+        texts = [text for _, text in chunk]
+        table_block = build_table_block(table_rows, texts)
+        pins_per_rule = select_pins_for_rules(client, texts, table_block, validators)
+        for (rule, _), pins in zip(chunk, pins_per_rule):
+            rule["pins"] = pins
+    updated = len(pending)
 
     # Write back
     try:
-        json_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        json_path.write_bytes(dumps_indented(data))
     except Exception as exc:
         return {"file": json_path.name, "status": "error", "error": f"write failed: {exc}"}
 
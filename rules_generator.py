@@ -3,13 +3,63 @@
 import warnings
 warnings.filterwarnings("ignore")
 
+import io
 import re
 import os
-from typing import List, Dict, Any, Set, Tuple
+import asyncio
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Pattern, Set, Tuple
 from pathlib import Path
-from openai import OpenAI
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
 from pydantic import BaseModel
 from dotenv import load_dotenv
+from bs4 import BeautifulSoup
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+try:
+    from datasketch import MinHash, MinHashLSH
+except ImportError:
+    MinHash = MinHashLSH = None
+
+try:
+    import fitz
+except ImportError:
+    fitz = None
+
+try:
+    import h2
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+try:
+    from .hyperparams import HP, page_workers
+    from .identify import HTML_PARSER, SelectolaxHTMLParser
+    from .json_io import content_key, dumps as json_dumps, dumps_indented, load_keyed, loads as json_loads, store_keyed
+    from .llm_limiter import OpenAIRateLimiter, estimate_tokens, retry_after, truncate_tokens
+    from .openai_batch import run_batch
+except ImportError:
+    from hyperparams import HP, page_workers
+    from identify import HTML_PARSER, SelectolaxHTMLParser
+    from json_io import content_key, dumps as json_dumps, dumps_indented, load_keyed, loads as json_loads, store_keyed
+    from llm_limiter import OpenAIRateLimiter, estimate_tokens, retry_after, truncate_tokens
+    from openai_batch import run_batch
 
 load_dotenv()
 
@@ -24,49 +74,154 @@ class RulesResponse(BaseModel):
 class GroupedRulesResponse(BaseModel):
     rules: List[DesignRule]
 
+class MultiBatchRules(BaseModel):
+    batches: List[RulesResponse]
+
+def strict_json_schema(model: type) -> Dict[str, Any]:
+    """model's JSON schema made valid for strict structured outputs (closed objects, all fields required)."""
+    schema = model.model_json_schema()
+    for node in [schema, *schema.get("$defs", {}).values()]:
+        if node.get("type") == "object":
+            node["additionalProperties"] = False
+            node["required"] = list(node.get("properties", {}))
+    return schema
+
+def response_format(name: str, model: type) -> Dict[str, Any]:
+    return {"type": "json_schema", "json_schema": {"name": name, "schema": strict_json_schema(model), "strict": True}}
+
+# Extraction requests use plain json_schema mode and read the rules as dicts
+RULES_FORMAT = response_format("rules", RulesResponse)
+MULTI_BATCH_RULES_FORMAT = response_format("rule_batches", MultiBatchRules)
+
+class PinnedDesignRule(DesignRule):
+    pins: List[str] = []
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+LLM_CONCURRENCY = HP.LLM_CONCURRENCY
+OPENAI_MAX_RPM = HP.OPENAI_MAX_RPM
+OPENAI_MAX_TPM = HP.OPENAI_MAX_TPM
+RULE_DEDUP_SIMILARITY = HP.RULE_DEDUP_SIMILARITY
+BATCHES_PER_REQUEST = HP.BATCHES_PER_REQUEST
+EXTRACTION_ATTEMPTS = 3
+CASCADE_MIN_RULES = HP.CASCADE_MIN_RULES
+PIN_RULES_PER_REQUEST = 15
+USE_BATCH_API = HP.USE_BATCH_API
+PAGE_TOKEN_BUDGET = HP.PAGE_TOKEN_BUDGET
+HTML_TOKEN_BUDGET = HP.HTML_TOKEN_BUDGET
+PAGES_PER_BATCH = 10
+
+# Bump PROMPT_VERSION whenever an extraction, pin or grouping prompt changes
+PROMPT_VERSION = "v7"
+PINS_MODEL = "gpt-4o"
+EXTRACTION_MODEL = "gpt-5"
+CASCADE_MODEL = "gpt-5-mini"
+EMBEDDING_MODEL = "text-embedding-3-small"
+MINHASH_THRESHOLD = 0.85
+MINHASH_NUM_PERM = 64
+GROUPING_MODEL = "gpt-5-mini"
+# Rules cached before the single-pass cleanup fix end in "..."; the new kind leaves them behind
+RULES_CACHE_KIND = "rules-v2"
+PINS_CACHE_KIND = "rule-pins"
+
+
+class MissingAPIKeyError(RuntimeError):
+    """No OpenAI key configured; extraction helpers re-raise it instead of returning no rules."""
+
+
+def require_api_key() -> None:
+    """Fail before any datasheet parsing when no key is configured (env or untracked .env)."""
+    if not OPENAI_API_KEY:
+        raise MissingAPIKeyError("OPENAI_API_KEY is not set; export it or put it in a local .env file")
+
+
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+
+
+@lru_cache(maxsize=None)
+def get_client() -> OpenAI:
+    """Process-wide sync client, so every call reuses one keep-alive connection pool."""
+    return OpenAI(
+        api_key=OPENAI_API_KEY,
+        http_client=httpx.Client(limits=HTTP_LIMITS, http2=HTTP2),
+    )
 
 
 class PinsResponse(BaseModel):
     pins: List[str]
 
 
-def normalize_pin_table(pin_table: List[List[str]]) -> Tuple[Set[str], Set[str], Dict[str, str], Dict[str, str]]:
-    """Prepare lookup sets and mappings for pin validation.
+class RulePins(BaseModel):
+    rule_index: int
+    pins: List[str]
+
+
+class RulePinsBatch(BaseModel):
+    items: List[RulePins]
+
+# Batch API pin requests are raw JSON bodies, so they need the schema rather than the model
+RULE_PINS_FORMAT = response_format("rule_pins", RulePinsBatch)
+
+
+# A rule that mentions pins by number ("pin 7", "pins 1, 2")
+PIN_NUMBER_MENTION = r'pins?\s*#?\s*\d+'
+PIN_NAME_STEM_RE = re.compile(r'[a-z]{2,}')
+# Separators inside multi-function pin names such as "PA9/USART1_TX" (as in rule_fixer)
+PIN_NAME_SPLIT_RE = re.compile(r'[\s/,]+')
 
-    Returns:
-    - allowed_pin_names: lowercased set of pin names
-    - allowed_pin_numbers: lowercased set of pin numbers
-    - number_to_name: lowercased pin number -> canonical name
-    - name_to_canonical: lowercased pin name -> canonical name
+
+@dataclass(frozen=True)
+class PinLookup:
+    # Lowercased pin name or number -> canonical pin name
+    canonical: Dict[str, str]
+    # Matches rule text that could refer to a pin in the table; None when nothing can
+    mention_re: Optional[Pattern[str]]
+
+
+def normalize_pin_table(pin_table: List[List[str]]) -> PinLookup:
+    """Prepare the lookup for pin validation.
+
+    Maps every lowercased pin name to its canonical name and every lowercased pin number
+    to its pin's name; a token that is both a name and a number resolves as a name.
+    mention_re matches pin names and each function of a multi-function name (PA0/ADC1 gives
+    PA0 and ADC1), their alphabetic stems (VDD may mean VDD1), non-numeric pin numbers such as
+    ball refs, and "pin N" phrases.
     """
-    allowed_pin_names: Set[str] = set()
-    allowed_pin_numbers: Set[str] = set()
     number_to_name: Dict[str, str] = {}
     name_to_canonical: Dict[str, str] = {}
 
     if not pin_table or len(pin_table) < 2:
         print("Warning: No valid pin table found - pin validation will be skipped")
-        return allowed_pin_names, allowed_pin_numbers, number_to_name, name_to_canonical
+        return PinLookup({}, None)
 
     for row in pin_table[1:]:
         if not row:
             continue
         pin_number = str(row[0]).strip() if len(row) > 0 else ""
         pin_name = str(row[1]).strip() if len(row) > 1 else ""
-        if pin_number:
-            allowed_pin_numbers.add(pin_number.lower())
         if pin_name:
-            allowed_pin_names.add(pin_name.lower())
             name_to_canonical[pin_name.lower()] = pin_name
         if pin_number and pin_name:
             number_to_name[pin_number.lower()] = pin_name
 
-    return allowed_pin_names, allowed_pin_numbers, number_to_name, name_to_canonical
+    name_parts = dict.fromkeys(part for name in name_to_canonical for part in PIN_NAME_SPLIT_RE.split(name) if part)
+    tokens = dict.fromkeys(name_to_canonical)
+    tokens.update(name_parts)
+    tokens.update(dict.fromkeys(n for n in number_to_name if not n.isdigit()))
+    tokens.update(dict.fromkeys(m.group() for m in map(PIN_NAME_STEM_RE.match, name_parts) if m))
+    alternatives = [re.escape(t) for t in sorted(tokens, key=len, reverse=True)] + [PIN_NUMBER_MENTION]
+    # Only letters delimit a mention, so VDD also matches VDD_CORE / VDD2 in rule text
+    mention_re = re.compile(r'(?<![a-z])(?:' + "|".join(alternatives) + r')(?![a-z])', re.IGNORECASE)
 
+    number_to_name.update(name_to_canonical)
+    return PinLookup(number_to_name, mention_re)
 
-def build_pins_prompt(rule_text: str, pin_table: List[List[str]]) -> str:
-    """Construct prompt for selecting associated pins for a rule."""
+
+def mentions_pins(rule_text: str, pin_lookup: PinLookup) -> bool:
+    """Cheap lexical check; rules that cannot refer to any table pin skip pin selection."""
+    return pin_lookup.mention_re is not None and pin_lookup.mention_re.search(rule_text) is not None
+
+
+def build_pin_table_block(pin_table: List[List[str]]) -> str:
     lines: List[str] = []
     header = pin_table[0] if pin_table else []
     header_str = ", ".join([str(h).strip() for h in header]) if header else "Pin, Name, Type, Description"
@@ -77,53 +232,94 @@ def build_pins_prompt(rule_text: str, pin_table: List[List[str]]) -> str:
         parts = [str(c).strip() for c in row]
         lines.append(" | ".join(parts))
 
-    table_block = "\n".join(lines)
+    return "\n".join(lines)
+
+
+PINS_INSTRUCTIONS = (
+    "You are an expert hardware design engineer. Given a design rule and the device pin table, "
+    "identify ONLY the specific pins from the table that are directly mentioned or electrically involved in the rule.\n\n"
+    "IMPORTANT: Be precise and selective - return ONLY pins that are:\n"
+    "- Explicitly mentioned by name or number in the rule text\n"
+    "- Directly involved in the electrical connections described by the rule\n"
+    "- Required for the specific electrical circuit or interface mentioned in the rule\n\n"
+    "INCLUDE pins for these scenarios:\n"
+    "- Power supply rules: ONLY the specific power pins mentioned (VDD, VCC, VSS, GND, etc.)\n"
+    "- Interface rules: ONLY the specific communication pins (SDA/SCL for I2C; MOSI/MISO/SCK for SPI, etc.)\n"
+    "- Clock rules: ONLY the specific clock pins mentioned (XTAL, OSC, CLK, etc.)\n"
+    "- Analog rules: ONLY the specific analog pins mentioned (AIN, VREF, etc.)\n"
+    "- Connection rules: ONLY the pins specifically named in the connection\n\n"
+    "EXCLUDE pins for these scenarios:\n"
+    "- General mechanical rules (lead length, package mounting, thermal considerations)\n"
+    "- General electrical rules that apply to the entire component without mentioning specific pins\n"
+    "- Layout rules about trace routing that don't specify particular pins\n"
+    "- Assembly or manufacturing rules not related to specific pin connections\n"
+    "- Component placement rules that don't involve specific pin connections\n\n"
+    "MATCHING RULES:\n"
+    "- Match pin names case-insensitively (VDD matches vdd, Vdd, etc.)\n"
+    "- Match partial names only if clearly referring to the same pin (VDD matches VDD1, VDD_CORE, etc.)\n"
+    "- Map pin numbers to names using the table\n\n"
+    "EXAMPLES:\n"
+    "- Rule: 'Connect VDD pin to 3.3V supply' → Return: ['VDD'] (if VDD exists in table)\n"
+    "- Rule: 'Minimize lead length of TO-220 packages' → Return: [] (general mechanical rule)\n"
+    "- Rule: 'Place 100nF capacitor near device' → Return: [] (general placement rule)\n"
+    "- Rule: 'Connect SDA and SCL with 4.7kΩ pull-ups' → Return: ['SDA', 'SCL'] (if they exist)\n"
+    "- Rule: 'Ensure proper power sequencing' → Return: [] (general rule, no specific pins mentioned)\n\n"
+    "Return ONLY pin names from the table's Name column that are specifically relevant to this rule. "
+    "If the rule is general and doesn't mention specific pins, return an empty list. "
+    "Do not invent pins not present in the table.\n\n"
+)
+
+
+def build_pins_prompt(rule_text: str, pin_table: List[List[str]]) -> str:
+    """Construct prompt for selecting associated pins for a rule."""
     return (
-        "You are an expert hardware design engineer. Given a design rule and the device pin table, "
-        "identify ONLY the specific pins from the table that are directly mentioned or electrically involved in the rule.\n\n"
-        "IMPORTANT: Be precise and selective - return ONLY pins that are:\n"
-        "- Explicitly mentioned by name or number in the rule text\n"
-        "- Directly involved in the electrical connections described by the rule\n"
-        "- Required for the specific electrical circuit or interface mentioned in the rule\n\n"
-        "INCLUDE pins for these scenarios:\n"
-        "- Power supply rules: ONLY the specific power pins mentioned (VDD, VCC, VSS, GND, etc.)\n"
-        "- Interface rules: ONLY the specific communication pins (SDA/SCL for I2C; MOSI/MISO/SCK for SPI, etc.)\n"
-        "- Clock rules: ONLY the specific clock pins mentioned (XTAL, OSC, CLK, etc.)\n"
-        "- Analog rules: ONLY the specific analog pins mentioned (AIN, VREF, etc.)\n"
-        "- Connection rules: ONLY the pins specifically named in the connection\n\n"
-        "EXCLUDE pins for these scenarios:\n"
-        "- General mechanical rules (lead length, package mounting, thermal considerations)\n"
-        "- General electrical rules that apply to the entire component without mentioning specific pins\n"
-        "- Layout rules about trace routing that don't specify particular pins\n"
-        "- Assembly or manufacturing rules not related to specific pin connections\n"
-        "- Component placement rules that don't involve specific pin connections\n\n"
-        "MATCHING RULES:\n"
-        "- Match pin names case-insensitively (VDD matches vdd, Vdd, etc.)\n"
-        "- Match partial names only if clearly referring to the same pin (VDD matches VDD1, VDD_CORE, etc.)\n"
-        "- Map pin numbers to names using the table\n\n"
-        "EXAMPLES:\n"
-        "- Rule: 'Connect VDD pin to 3.3V supply' → Return: ['VDD'] (if VDD exists in table)\n"
-        "- Rule: 'Minimize lead length of TO-220 packages' → Return: [] (general mechanical rule)\n"
-        "- Rule: 'Place 100nF capacitor near device' → Return: [] (general placement rule)\n"
-        "- Rule: 'Connect SDA and SCL with 4.7kΩ pull-ups' → Return: ['SDA', 'SCL'] (if they exist)\n"
-        "- Rule: 'Ensure proper power sequencing' → Return: [] (general rule, no specific pins mentioned)\n\n"
-        "Return ONLY pin names from the table's Name column that are specifically relevant to this rule. "
-        "If the rule is general and doesn't mention specific pins, return an empty list. "
-        "Do not invent pins not present in the table.\n\n"
-        f"RULE:\n{rule_text}\n\n"
-        f"PIN TABLE:\n{table_block}\n\n"
+        PINS_INSTRUCTIONS
+        + f"RULE:\n{rule_text}\n\n"
+        f"PIN TABLE:\n{build_pin_table_block(pin_table)}\n\n"
         "Analyze the rule carefully and return ONLY the specifically relevant pin names."
     )
 
 
-def select_pins_for_rule(client: OpenAI, rule_text: str, pin_table: List[List[str]]) -> List[str]:
+def build_pins_batch_prompt(rule_texts: List[str], pin_table: List[List[str]]) -> str:
+    """Construct one prompt selecting pins for several rules against a single copy of the pin table."""
+    rules_block = "\n".join(f"{i}. {text}" for i, text in enumerate(rule_texts))
+    return (
+        PINS_INSTRUCTIONS
+        + "Apply these instructions to each numbered rule below independently. "
+        "Return exactly one item per rule, with rule_index set to the rule's number from the list.\n\n"
+        f"RULES:\n{rules_block}\n\n"
+        f"PIN TABLE:\n{build_pin_table_block(pin_table)}\n\n"
+        "Analyze each rule carefully and return ONLY its specifically relevant pin names."
+    )
+
+
+PINS_SYSTEM_PROMPT = "You are an expert at mapping design rules to specific pins from device pin tables. Be precise and selective - only include pins that are directly mentioned or electrically involved in the rule."
+
+
+def validate_pins(model_pins: List[str], pin_lookup: PinLookup) -> List[str]:
+    """Map model-returned pins onto canonical pin-table names, dropping unknown pins.
+
+    pin_lookup is normalize_pin_table(pin_table), built once per datasheet by the caller.
+    """
+    # One dict lookup per pin; dict.fromkeys de-duplicates while keeping the model's order
+    lookup = pin_lookup.canonical.get
+    canonical = (lookup(str(raw_pin).strip().lower()) for raw_pin in model_pins)
+    return list(dict.fromkeys(name for name in canonical if name))
+
+
+def select_pins_for_rule(
+    client: OpenAI, rule_text: str, pin_table: List[List[str]], pin_lookup: Optional[PinLookup] = None
+) -> List[str]:
     """Call LLM to select pins for rule and validate against pin table."""
+    pin_lookup = pin_lookup or normalize_pin_table(pin_table)
+    if not mentions_pins(rule_text, pin_lookup):
+        return []
     try:
         prompt = build_pins_prompt(rule_text, pin_table)
         completion = client.beta.chat.completions.parse(
-            model="gpt-4o",
+            model=PINS_MODEL,
             messages=[
-                {"role": "system", "content": "You are an expert at mapping design rules to specific pins from device pin tables. Be precise and selective - only include pins that are directly mentioned or electrically involved in the rule."},
+                {"role": "system", "content": PINS_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt},
             ],
             response_format=PinsResponse,
@@ -135,137 +331,427 @@ def select_pins_for_rule(client: OpenAI, rule_text: str, pin_table: List[List[st
         print(f"Error selecting pins: {exc}")
         model_pins = []
 
-    allowed_names, allowed_numbers, number_to_name, name_to_canonical = normalize_pin_table(pin_table)
-
-    normalized: List[str] = []
-    seen: Set[str] = set()
-    for raw_pin in model_pins:
-        candidate = str(raw_pin).strip()
-        cl = candidate.lower()
-        canonical = ""
-        if cl in allowed_names:
-            canonical = name_to_canonical.get(cl, candidate)
-        elif cl in allowed_numbers:
-            mapped = number_to_name.get(cl)
-            if mapped:
-                canonical = mapped
-        if canonical and canonical not in seen:
-            seen.add(canonical)
-            normalized.append(canonical)
-    return normalized
-
-def extract_comprehensive_rules_from_datasheet(file_path: Path, pin_table: List[List[str]]) -> List[Dict[str, Any]]:
-    """Extract comprehensive design rules using LLM analysis of full datasheet content."""
-    
+    return validate_pins(model_pins, pin_lookup)
+
+
+def pins_cache_key(rule_text: str, pin_table_key: str) -> str:
+    return content_key(rule_text.strip().lower().encode("utf-8"), pin_table_key.encode(), PROMPT_VERSION.encode(), PINS_MODEL.encode())
+
+
+async def request_pins_for_rules(
+    limiter: OpenAIRateLimiter, rule_texts: List[str], pin_table: List[List[str]]
+) -> List[Optional[List[str]]]:
+    """Raw model pins per rule from one LLM call; None where the model gave no answer or the call failed."""
     try:
-        import pdfplumber
-        
-        # Extract all relevant text from the datasheet
-        all_content_sections = []
-        
-        with pdfplumber.open(file_path) as pdf:
-            print(f"Processing {len(pdf.pages)} pages for comprehensive rule extraction...")
-            
-            # Extract text from all pages
+        prompt = build_pins_batch_prompt(rule_texts, pin_table)
+        completion = await limiter.parse(
+            model=PINS_MODEL,
+            messages=[
+                {"role": "system", "content": PINS_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            response_format=RulePinsBatch,
+            max_completion_tokens=10000,
+        )
+        parsed = completion.choices[0].message.parsed if completion.choices else None
+        items: List[RulePins] = parsed.items if parsed else []
+    except Exception as exc:
+        print(f"Error selecting pins: {exc}")
+        items = []
+
+    return pins_by_index(((item.rule_index, item.pins) for item in items), len(rule_texts))
+
+
+def pins_by_index(items: Iterable[Tuple[int, List[str]]], count: int) -> List[Optional[List[str]]]:
+    """Order (rule_index, pins) answers by rule; the first answer per index wins, unanswered rules are None."""
+    by_index: Dict[int, List[str]] = {}
+    for rule_index, pins in items:
+        if 0 <= rule_index < count:
+            by_index.setdefault(rule_index, pins)
+    return [by_index.get(i) for i in range(count)]
+
+
+async def select_pins_for_rules_async(
+    limiter: OpenAIRateLimiter,
+    rule_texts: List[str],
+    pin_table: List[List[str]],
+    pin_lookup: PinLookup,
+    failures: Optional[List[str]] = None,
+) -> List[List[str]]:
+    """Select pins for several rules in one LLM call; result i holds the validated pins for rule_texts[i].
+
+    Answers are cached on disk per (rule text, pin table), so a rule seen before for this
+    device - in another batch or an earlier run - costs no request. Failures are not cached,
+    and are recorded in failures when given.
+    """
+    if not rule_texts:
+        return []
+    pin_table_key = content_key(dumps_indented(pin_table))
+    keys = [pins_cache_key(text, pin_table_key) for text in rule_texts]
+    model_pins: List[Optional[List[str]]] = [load_keyed(PINS_CACHE_KIND, key) for key in keys]
+
+    missing = [i for i, pins in enumerate(model_pins) if pins is None]
+    if missing:
+        fetched = await request_pins_for_rules(limiter, [rule_texts[i] for i in missing], pin_table)
+        unanswered = sum(pins is None for pins in fetched)
+        if unanswered and failures is not None:
+            failures.append(f"pin selection for {unanswered} rule(s)")
+        for i, pins in zip(missing, fetched):
+            if pins is not None:
+                store_keyed(PINS_CACHE_KIND, keys[i], pins)
+            model_pins[i] = pins
+
+    return [validate_pins(pins or [], pin_lookup) for pins in model_pins]
+
+
+def select_pins_with_batch_api(
+    client: OpenAI,
+    rules: List[Dict[str, Any]],
+    pin_table: List[List[str]],
+    pin_lookup: PinLookup,
+    failures: Optional[List[str]] = None,
+) -> None:
+    """Set rule["pins"] for every rule, sending the uncached pin selections as one Batch API job.
+
+    Failed or unanswered selections are recorded in failures when given.
+    """
+    failures = [] if failures is None else failures
+    pin_table_key = content_key(dumps_indented(pin_table))
+    for r in rules:
+        r["pins"] = []
+    rules = [r for r in rules if mentions_pins(str(r.get("rule", "")), pin_lookup)]
+    keys = [pins_cache_key(str(r["rule"]), pin_table_key) for r in rules]
+    model_pins: List[Optional[List[str]]] = [load_keyed(PINS_CACHE_KIND, key) for key in keys]
+
+    missing = [i for i, pins in enumerate(model_pins) if pins is None]
+    groups = [missing[i:i + PIN_RULES_PER_REQUEST] for i in range(0, len(missing), PIN_RULES_PER_REQUEST)]
+    bodies = {
+        f"pins-{n}": {
+            "model": PINS_MODEL,
+            "messages": [
+                {"role": "system", "content": PINS_SYSTEM_PROMPT},
+                {"role": "user", "content": build_pins_batch_prompt([str(rules[i]["rule"]).strip() for i in group], pin_table)},
+            ],
+            "response_format": RULE_PINS_FORMAT,
+            "max_completion_tokens": 10000,
+        }
+        for n, group in enumerate(groups)
+    }
+    responses = run_batch(client, bodies)
+    for n, group in enumerate(groups):
+        try:
+            items = json_loads(responses[f"pins-{n}"]["choices"][0]["message"]["content"])["items"]
+            fetched = pins_by_index(((item["rule_index"], item["pins"]) for item in items), len(group))
+        except Exception as e:
+            print(f"Error selecting pins (batch request pins-{n}): {e}")
+            failures.append(f"batch request pins-{n}")
+            continue
+        if any(pins is None for pins in fetched):
+            failures.append(f"batch request pins-{n} left rules unanswered")
+        for i, pins in zip(group, fetched):
+            if pins is not None:
+                store_keyed(PINS_CACHE_KIND, keys[i], pins)
+            model_pins[i] = pins
+
+    for r, pins in zip(rules, model_pins):
+        r["pins"] = validate_pins(pins or [], pin_lookup)
+
+
+def extract_batches_with_batch_api(
+    batches: Iterable[List[Dict]],
+    pin_context: str,
+    device_name: str,
+    pin_table: List[List[str]],
+    failures: Optional[List[str]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """Batch API counterpart of extract_batches_async: one job for extraction, one for pin selection.
+
+    Roughly half the price of the synchronous API at the cost of latency (jobs may take hours),
+    so it suits large unattended runs. Uses EXTRACTION_MODEL directly, without the cascade.
+    Like extract_batches_async, rules come back already cleaned and deduplicated (before their
+    pin selection is paid for); callers must not clean them again. Failed requests are recorded
+    in failures when given.
+    """
+    failures = [] if failures is None else failures
+    client = get_client()
+    groups = list(iter_batches(batches, max(1, BATCHES_PER_REQUEST)))
+    bodies = {
+        f"extract-{n}": {
+            "model": EXTRACTION_MODEL,
+            "messages": build_extraction_messages(group, pin_context, device_name),
+            "response_format": MULTI_BATCH_RULES_FORMAT if len(group) > 1 else RULES_FORMAT,
+            "max_completion_tokens": 50000,
+        }
+        for n, group in enumerate(groups)
+    }
+    responses = run_batch(client, bodies)
+
+    results: List[List[Dict[str, Any]]] = []
+    seen_rules: Set[str] = set()
+    for n, group in enumerate(groups):
+        try:
+            content = responses[f"extract-{n}"]["choices"][0]["message"]["content"]
+            group_rules = split_batch_rules(json_loads(content), len(group))
+        except Exception as e:
+            print(f"Error in LLM rule extraction for pages {group[0][0]['page']}-{group[-1][-1]['page']}: {e}")
+            failures.append(f"batch request extract-{n}")
+            group_rules = [[] for _ in group]
+        for batch, batch_rules in zip(group, group_rules):
+            # The only cleaning pass for these rules; duplicates are dropped before pin selection
+            results.append(remove_duplicate_rules(batch_rules, seen_rules))
+            print(f"Processed pages {batch[0]['page']}-{batch[-1]['page']}, found {len(results[-1])} rules")
+
+    select_pins_with_batch_api(
+        client, [r for batch_rules in results for r in batch_rules], pin_table, normalize_pin_table(pin_table), failures
+    )
+    return results
+
+
+def rules_cache_key(pdf_bytes: bytes, pin_table: List[List[str]], use_batch_api: bool = USE_BATCH_API) -> str:
+    """Content address of an extraction: datasheet bytes, pin table, prompt version, models and
+    every extraction setting that changes the resulting rules."""
+    settings = {
+        "models": [EXTRACTION_MODEL, CASCADE_MODEL, PINS_MODEL, GROUPING_MODEL, EMBEDDING_MODEL],
+        "cascade_min_rules": CASCADE_MIN_RULES,
+        # The Batch API path extracts without the cascade
+        "batch_api": use_batch_api,
+        # Page text comes from PyMuPDF when installed, else pdfplumber; they extract differently
+        "pdf_backend": "pymupdf" if fitz is not None else "pdfplumber",
+        "pages_per_batch": PAGES_PER_BATCH,
+        "batches_per_request": BATCHES_PER_REQUEST,
+        "page_token_budget": PAGE_TOKEN_BUDGET,
+        "pin_rules_per_request": PIN_RULES_PER_REQUEST,
+        "rule_dedup_similarity": RULE_DEDUP_SIMILARITY,
+        "minhash": [MINHASH_THRESHOLD, MINHASH_NUM_PERM],
+    }
+    return content_key(pdf_bytes, dumps_indented(pin_table), PROMPT_VERSION.encode(), json_dumps(settings))
+
+
+def load_cached_rules(key: str) -> Optional[List[Dict[str, Any]]]:
+    cached = load_keyed(RULES_CACHE_KIND, key)
+    if cached is None:
+        return None
+    try:
+        return [PinnedDesignRule.model_validate(r).model_dump() for r in cached]
+    except Exception:
+        return None
+
+
+def page_text(page_num: int, get_text: Callable[[], Optional[str]]) -> str:
+    try:
+        return get_text() or ""
+    except Exception as e:
+        print(f"Error processing page {page_num + 1}: {e}")
+        return ""
+
+
+def fitz_page_texts(pdf_bytes: bytes, start: int, stop: int) -> List[str]:
+    # MuPDF documents must not be shared across threads, so every worker opens its own
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [page_text(n, lambda n=n: doc[n].get_text("text")) for n in range(start, stop)]
+
+
+# Set once per process-pool worker by init_page_worker, so the PDF is pickled once per worker
+_WORKER_PDF_BYTES = b""
+
+
+def init_page_worker(pdf_bytes: bytes) -> None:
+    global _WORKER_PDF_BYTES
+    _WORKER_PDF_BYTES = pdf_bytes
+
+
+def plumber_page_texts(start: int, stop: int) -> List[str]:
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(_WORKER_PDF_BYTES), pages=list(range(start + 1, stop + 1))) as pdf:
+        return [page_text(start + i, page.extract_text) for i, page in enumerate(pdf.pages)]
+
+
+def iter_pooled_page_texts(
+    executor: Executor, workers: int, fn: Callable[..., List[str]], page_count: int, *args: Any
+) -> Iterator[Tuple[int, str]]:
+    """Yield (page_num, text) in order from fn(*args, start, stop) run on executor per PAGES_PER_BATCH pages.
+
+    At most two page runs per worker are in flight ahead of the consumer.
+    """
+    starts = iter(range(0, page_count, PAGES_PER_BATCH))
+
+    def submit(start: int) -> Tuple[int, Future]:
+        return start, executor.submit(fn, *args, start, min(start + PAGES_PER_BATCH, page_count))
+
+    pending = deque(submit(start) for start in islice(starts, 2 * workers))
+    while pending:
+        start, future = pending.popleft()
+        next_start = next(starts, None)
+        if next_start is not None:
+            pending.append(submit(next_start))
+        yield from enumerate(future.result(), start)
+
+
+def iter_page_texts(pdf_bytes: bytes) -> Iterator[Tuple[int, str]]:
+    """Yield (page_num, text) per PDF page in order; PyMuPDF when installed, else pdfplumber.
+
+    PyMuPDF pages are extracted on a thread pool. pdfplumber's layout analysis is pure Python
+    and holds the GIL, so its pages are extracted on a process pool instead. Both are sized by
+    page_workers(); with one worker (e.g. inside a rules_runner process) pages are read inline.
+    """
+    workers = page_workers()
+    if fitz is not None:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            page_count = doc.page_count
+        print(f"Processing {page_count} pages for comprehensive rule extraction...")
+        if workers <= 1:
+            yield from enumerate(fitz_page_texts(pdf_bytes, 0, page_count))
+            return
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            yield from iter_pooled_page_texts(executor, workers, fitz_page_texts, page_count, pdf_bytes)
+        return
+
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        page_count = len(pdf.pages)
+        print(f"Processing {page_count} pages for comprehensive rule extraction...")
+        if workers <= 1 or page_count <= PAGES_PER_BATCH:
+            # Serial when configured so, or too few pages to pay for starting worker processes
             for page_num, page in enumerate(pdf.pages):
-                try:
-                    text = page.extract_text() or ""
-                    if text.strip():
-                        # Clean and prepare text
-                        cleaned_text = clean_text(text)
-                        all_content_sections.append({
-                            "page": page_num + 1,
-                            "content": cleaned_text
-                        })
-                except Exception as e:
-                    print(f"Error processing page {page_num + 1}: {e}")
-                    continue
-        
-        if not all_content_sections:
-            print("No content extracted from PDF")
-            return []
+                yield page_num, page_text(page_num, page.extract_text)
+            return
+    # This generator is advanced from a worker thread of the asyncio loop; forking a threaded
+    # process can deadlock, so the workers are spawned
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_page_worker,
+        initargs=(pdf_bytes,),
+    ) as executor:
+        yield from iter_pooled_page_texts(executor, workers, plumber_page_texts, page_count)
+
+
+def cap_tokens(text: str, max_tokens: int, source: str) -> str:
+    """text cut to max_tokens tokens (0 = no cap), logging how much of source was dropped."""
+    if max_tokens <= 0:
+        return text
+    capped = truncate_tokens(text, max_tokens)
+    if len(capped) < len(text):
+        print(f"Truncated {source}: dropped ~{estimate_tokens(text) - max_tokens} tokens over the {max_tokens}-token cap")
+    return capped
+
+
+def iter_content_sections(pdf_bytes: bytes, source: str = "PDF") -> Iterator[Dict[str, Any]]:
+    """Yield {"page", "content"} for every PDF page with text, cleaned, one page at a time."""
+    for page_num, text in iter_page_texts(pdf_bytes):
+        if text.strip():
+            content = cap_tokens(clean_text(text), PAGE_TOKEN_BUDGET, f"{source} page {page_num + 1}")
+            yield {"page": page_num + 1, "content": content}
+
+
+def iter_batches(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    it = iter(items)
+    return iter(lambda: list(islice(it, batch_size)), [])
+
+
+def extract_comprehensive_rules_from_datasheet(
+    file_path: Path, pin_table: List[List[str]], use_batch_api: bool = USE_BATCH_API
+) -> List[Dict[str, Any]]:
+    """Extract comprehensive design rules using LLM analysis of full datasheet content.
+
+    Results are cached on disk by rules_cache_key, so re-running an unchanged datasheet
+    costs one hash of its bytes instead of the LLM calls. use_batch_api routes the LLM
+    calls through the OpenAI Batch API (cheaper, slow) instead of the interactive API.
+    """
+    
+    try:
+        # The datasheet is read from disk once; hashing and every parser share these bytes
+        pdf_bytes = file_path.read_bytes()
+        cache_key = rules_cache_key(pdf_bytes, pin_table, use_batch_api)
+        cached = load_cached_rules(cache_key)
+        if cached is not None:
+            print(f"Loaded {len(cached)} cached rules for {file_path.name}")
+            return cached
+        require_api_key()
         
         # Extract pin information for context
         pin_context = extract_pin_context(pin_table)
         
-        # Process content in batches to stay within token limits
-        all_rules = []
-        batch_size = 10  # Process 10 pages at a time
-        
-        for i in range(0, len(all_content_sections), batch_size):
-            batch = all_content_sections[i:i+batch_size]
-            batch_rules = extract_rules_from_content_batch(batch, pin_context, file_path.stem, pin_table)
-            all_rules.extend(batch_rules)
-            print(f"Processed pages {i+1}-{min(i+batch_size, len(all_content_sections))}, found {len(batch_rules)} rules")
+        # Pages are parsed lazily and sent in batches of 10 as soon as they are ready
+        batches = iter_batches(iter_content_sections(pdf_bytes, file_path.name), PAGES_PER_BATCH)
+        # Every LLM call that failed (after retries) or fell back; any entry keeps this run out of the cache
+        failures: List[str] = []
+        if use_batch_api:
+            batch_results = extract_batches_with_batch_api(batches, pin_context, file_path.stem, pin_table, failures)
+        else:
+            batch_results = asyncio.run(extract_batches_async(batches, pin_context, file_path.stem, pin_table, failures))
+        if not batch_results:
+            print("No content extracted from PDF")
+            return []
         
-        # Remove duplicates while preserving order
-        unique_rules = remove_duplicate_rules(all_rules)
+        # Both extraction paths already cleaned each rule before pin selection; this pass only
+        # drops duplicates across requests, batch by batch against the rules kept so far
+        seen_rules: Set[str] = set()
+        unique_rules = []
+        for batch_rules in batch_results:
+            unique_rules.extend(remove_duplicate_rules(batch_rules, seen_rules, clean=False))
+        unique_rules = remove_near_duplicate_rules(remove_lexical_near_duplicates(unique_rules), failures)
         print(f"Total unique rules extracted: {len(unique_rules)}")
         
         # Group and categorize rules for better organization
         if unique_rules:
-            grouped_rules = group_and_categorize_rules(unique_rules)
-            return grouped_rules
+            unique_rules = group_and_categorize_rules(unique_rules, failures)
+            if failures:
+                # A transient error must not be served as this datasheet's result on every later run
+                print(f"Not caching rules for {file_path.name}; {len(failures)} failed call(s): {'; '.join(failures[:5])}")
+            else:
+                store_keyed(RULES_CACHE_KIND, cache_key, unique_rules)
         
         return unique_rules
         
+    except MissingAPIKeyError:
+        # Not a per-file failure: an empty checklist here would be written out as a result
+        raise
     except Exception as e:
         print(f"Error in comprehensive rule extraction: {e}")
         return []
 
+WHITESPACE_RE = re.compile(r'\s+')
+# Page headers/footers (DocID ... Rev N) and page numbers (N/M)
+PAGE_NOISE_RE = re.compile(r'DocID\d+.*?Rev\s+\d+|\d+/\d+')
+
+
 def clean_text(text: str) -> str:
     """Clean and normalize text for LLM processing."""
     if not text:
         return ""
     
-    # Remove excessive whitespace and normalize
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[\t\n\r]+', ' ', text)
-    
-    # Remove page headers/footers and common noise
-    text = re.sub(r'DocID\d+.*?Rev\s+\d+', '', text)
-    text = re.sub(r'\d+/\d+', '', text)  # Page numbers
-    
-    return text.strip()
+    # Whitespace is collapsed first so a DocID...Rev footer split across lines still matches
+    return PAGE_NOISE_RE.sub('', WHITESPACE_RE.sub(' ', text)).strip()
 
 def extract_pin_context(pin_table: List[List[str]]) -> str:
-    """Extract pin information to provide context for rule extraction."""
+    """Extract pin information to provide context for rule extraction.
+
+    Memoized on the table contents: the HTML and PDF paths of one device share a pin table,
+    and an identical string keeps the system-message prefix cacheable across requests.
+    """
+    return pin_context_cached(tuple(tuple(row) for row in pin_table or ()))
+
+@lru_cache(maxsize=64)
+def pin_context_cached(pin_table: Tuple[Tuple[str, ...], ...]) -> str:
     if not pin_table or len(pin_table) < 2:
         return "No pin table available."
     
-    pin_info = []
-    headers = pin_table[0] if pin_table else []
-    
-    for row in pin_table[1:]:
-        if len(row) >= 2:
-            pin_num = row[0].strip()
-            pin_name = row[1].strip()
-            pin_type = row[2].strip() if len(row) > 2 else ""
-            pin_desc = row[3].strip() if len(row) > 3 else ""
-            
-            pin_info.append(f"Pin {pin_num}: {pin_name} ({pin_type}) - {pin_desc}")
-    
-    return f"Device pins:\\n" + "\\n".join(pin_info[:15])  # Limit to first 15 pins
+    # Only the first 15 pins go into the prompt, so only those get formatted
+    rows = islice((row for row in pin_table[1:] if len(row) >= 2), 15)
+    pin_info = "\n".join(
+        f"Pin {row[0].strip()}: {row[1].strip()} ({row[2].strip() if len(row) > 2 else ''}) - {row[3].strip() if len(row) > 3 else ''}"
+        for row in rows
+    )
+    return f"Device pins:\n{pin_info}"
 
-def extract_rules_from_content_batch(
-    content_sections: List[Dict],
-    pin_context: str,
-    device_name: str,
-    pin_table: List[List[str]],
-) -> List[Dict[str, Any]]:
-    """Extract design rules from a batch of content using LLM."""
-    
-    # Combine content from the batch
-    combined_content = ""
-    page_refs = []
-    
-    for section in content_sections:
-        combined_content += f"\\n\\n--- Page {section['page']} ---\\n{section['content']}"
-        page_refs.append(str(section['page']))
-    
-    prompt = f"""You are an expert hardware design engineer analyzing a semiconductor datasheet for {device_name}.
+EXTRACTION_SYSTEM_PROMPT = "You are an expert hardware design engineer extracting design rules from semiconductor datasheets."
 
-Extract ALL hardware design rules that can be verified by examining the schematic, netlist, and BOM. Focus on:
+# Everything that is identical across batches lives in the system message, ahead of the
+# per-batch datasheet content, so OpenAI's automatic prompt caching can reuse the prefix.
+EXTRACTION_INSTRUCTIONS = """Extract ALL hardware design rules that can be verified by examining the schematic, netlist, and BOM. Focus on:
 
 INCLUDE these types of rules:
 • Power supply voltage ranges and current requirements
@@ -320,105 +806,309 @@ For each rule:
 - Use ONLY pin names (never pin numbers) when referencing pins
 - Mark "essential" as True ONLY if the rule contains keywords like "absolute" or "mandatory", or if the circuit will fail to work without it
 - Mark "essential" as False for ALL recommendations, best practices, or optimization guidelines
-- Ensure the rule is completely self-contained
+- Ensure the rule is completely self-contained"""
+
+
+def format_content(content_sections: List[Dict]) -> str:
+    return "".join(f"\n\n--- Page {section['page']} ---\n{section['content']}" for section in content_sections)
+
 
-{pin_context}
+def page_refs(content_sections: List[Dict]) -> str:
+    return ", ".join(str(section['page']) for section in content_sections)
 
-DATASHEET CONTENT (Pages {', '.join(page_refs)}):
-{combined_content}
+
+EXTRACTION_SYSTEM_TEMPLATE = EXTRACTION_SYSTEM_PROMPT + "\n\n" + EXTRACTION_INSTRUCTIONS + "\n\n{pin_context}"
+
+EXTRACTION_USER_TEMPLATE = """DEVICE: {device_name}
+DATASHEET CONTENT (Pages {pages}):
+{content}
 
 Extract comprehensive hardware design rules from this content. Read all tables and specifications carefully and include specific values directly in the rules."""
 
-    try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
+MULTI_BATCH_USER_TEMPLATE = """DEVICE: {device_name}
+DATASHEET CONTENT IN {count} SECTIONS:
 
-        completion = client.beta.chat.completions.parse(
-            model="gpt-5",
-            messages=[
-                {"role": "system", "content": "You are an expert hardware design engineer extracting design rules from semiconductor datasheets."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format=RulesResponse,
-            max_completion_tokens=50000
+{sections}
+
+Extract comprehensive hardware design rules from each section independently. Read all tables and specifications carefully and include specific values directly in the rules. Return exactly {count} rules lists in "batches", one per section, in section order."""
+
+SECTION_TEMPLATE = "SECTION {number} (Pages {pages}):{content}"
+
+
+def build_extraction_messages(batches: List[List[Dict]], pin_context: str, device_name: str) -> List[Dict[str, str]]:
+    """Build the rule-extraction messages: static instructions + pin context, then page content.
+
+    Several page batches are sent as numbered SECTIONs, each answered by its own rules list.
+    """
+    system = EXTRACTION_SYSTEM_TEMPLATE.format(pin_context=pin_context)
+    if len(batches) == 1:
+        user = EXTRACTION_USER_TEMPLATE.format(
+            device_name=device_name, pages=page_refs(batches[0]), content=format_content(batches[0])
         )
-        
-        if completion.choices[0].message.parsed:
-            rules_response = completion.choices[0].message.parsed
-            extracted = [
-                {
-                    "rule": rule.rule,
-                    "category": rule.category,
-                    "essential": rule.essential,
-                }
-                for rule in rules_response.rules
+    else:
+        sections = "\n\n".join(
+            SECTION_TEMPLATE.format(number=n, pages=page_refs(batch), content=format_content(batch))
+            for n, batch in enumerate(batches, 1)
+        )
+        user = MULTI_BATCH_USER_TEMPLATE.format(device_name=device_name, count=len(batches), sections=sections)
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+
+def split_batch_rules(parsed: Dict[str, Any], batch_count: int) -> List[List[Dict[str, Any]]]:
+    """Per-batch rule lists from a decoded RULES_FORMAT / MULTI_BATCH_RULES_FORMAT response."""
+    responses = parsed["batches"] if batch_count > 1 else [parsed]
+    if len(responses) != batch_count:
+        print(f"Expected {batch_count} rule lists, got {len(responses)}")
+    results = []
+    for n in range(batch_count):
+        # Any surplus lists are folded into the last batch rather than dropped
+        chunk = responses[n:n + 1] if n < batch_count - 1 else responses[n:]
+        # Strict json_schema output already has exactly rule/category/essential
+        results.append([rule for response in chunk for rule in response["rules"]])
+    return results
+
+
+async def request_batch_rules(
+    limiter: OpenAIRateLimiter,
+    batches: List[List[Dict]],
+    pin_context: str,
+    device_name: str,
+    model: str,
+) -> Optional[List[List[Dict[str, Any]]]]:
+    """One rules list per batch from a single model request, or None if every attempt failed.
+
+    Rate limits and transient API errors are retried with exponential backoff (honouring
+    Retry-After); a malformed response is retried with the decoding error fed back to the model.
+    """
+    messages = build_extraction_messages(batches, pin_context, device_name)
+    pages = f"{batches[0][0]['page']}-{batches[-1][-1]['page']}"
+    error: Optional[Exception] = None
+
+    for attempt in range(EXTRACTION_ATTEMPTS):
+        try:
+            completion = await limiter.create(
+                model=model,
+                messages=messages,
+                response_format=MULTI_BATCH_RULES_FORMAT if len(batches) > 1 else RULES_FORMAT,
+                max_completion_tokens=50000
+            )
+        except openai.RateLimitError as e:
+            error = e
+            await asyncio.sleep(retry_after(e, 2 ** attempt))
+            continue
+        except (openai.APIConnectionError, openai.InternalServerError) as e:
+            error = e
+            await asyncio.sleep(2 ** attempt)
+            continue
+        except Exception as e:
+            error = e
+            break
+
+        content = completion.choices[0].message.content or ""
+        try:
+            return split_batch_rules(json_loads(content), len(batches))
+        except (ValueError, KeyError, TypeError) as e:
+            error = e
+            messages = messages + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": f"Your output had error: {e!r}. Fix it and return the complete JSON again."},
             ]
-            # Add pins to each rule
-            for r in extracted:
-                r_text = str(r.get("rule", "")).strip()
-                r["pins"] = select_pins_for_rule(client, r_text, pin_table) if r_text else []
-            return extracted
-        else:
-            print("Failed to parse structured response")
-            return []
-            
-    except Exception as e:
-        print(f"Error in LLM rule extraction: {e}")
-        return []
+
+    print(f"Error in LLM rule extraction ({model}) for pages {pages} after {attempt + 1} attempt(s): {error}")
+    return None
+
+
+async def extract_rules_from_content_batches_async(
+    limiter: OpenAIRateLimiter,
+    batches: List[List[Dict]],
+    pin_context: str,
+    device_name: str,
+    pin_table: List[List[str]],
+    pin_lookup: PinLookup,
+    failures: Optional[List[str]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """Extract design rules for several content batches in one LLM request; one rules list per batch.
+
+    With CASCADE_MIN_RULES set, batches go to CASCADE_MODEL first and only those yielding fewer
+    rules (or failing) are re-extracted with EXTRACTION_MODEL. Requests that still fail after
+    their retries are recorded in failures when given.
+    """
+    failures = [] if failures is None else failures
+    pages = f"{batches[0][0]['page']}-{batches[-1][-1]['page']}"
+    results: Optional[List[List[Dict[str, Any]]]] = None
+    if CASCADE_MIN_RULES > 0:
+        results = await request_batch_rules(limiter, batches, pin_context, device_name, CASCADE_MODEL)
+    if results is None:
+        results = await request_batch_rules(limiter, batches, pin_context, device_name, EXTRACTION_MODEL)
+        if results is None:
+            failures.append(f"rule extraction for pages {pages}")
+            results = [[] for _ in batches]
+    else:
+        sparse = [n for n, batch_rules in enumerate(results) if len(batch_rules) < CASCADE_MIN_RULES]
+        if sparse:
+            retried = await request_batch_rules(
+                limiter, [batches[n] for n in sparse], pin_context, device_name, EXTRACTION_MODEL
+            )
+            if retried is None:
+                failures.append(f"{EXTRACTION_MODEL} re-extraction for pages {pages}")
+            for n, batch_rules in zip(sparse, retried or []):
+                if len(batch_rules) > len(results[n]):
+                    results[n] = batch_rules
+
+    # Drop duplicates (and reference-only rules) before paying for their pin selection
+    seen_rules: Set[str] = set()
+    results = [remove_duplicate_rules(extracted, seen_rules) for extracted in results]
+
+    # Add pins to each rule, PIN_RULES_PER_REQUEST rules per request; the requests run
+    # concurrently behind the limiter
+    rules = [r for extracted in results for r in extracted]
+    for r in rules:
+        r["pins"] = []
+    # Rules that name no table pin (layout, mechanical, general) get [] without a request
+    rules = [r for r in rules if mentions_pins(str(r.get("rule", "")), pin_lookup)]
+    groups = [rules[i:i + PIN_RULES_PER_REQUEST] for i in range(0, len(rules), PIN_RULES_PER_REQUEST)]
+    pins_lists = await asyncio.gather(*[
+        select_pins_for_rules_async(limiter, [str(r["rule"]).strip() for r in group], pin_table, pin_lookup, failures)
+        for group in groups
+    ])
+    for group, group_pins in zip(groups, pins_lists):
+        for r, pins in zip(group, group_pins):
+            r["pins"] = pins
+    return results
+
+async def extract_batches_async(
+    batches: Iterable[List[Dict]],
+    pin_context: str,
+    device_name: str,
+    pin_table: List[List[str]],
+    failures: Optional[List[str]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """Run content batches concurrently behind one rate limiter (LLM_CONCURRENCY requests in flight).
+
+    Batches are packed BATCHES_PER_REQUEST to a request; results come back one list per batch.
+    batches may be a lazy generator: it is advanced in a worker thread and each request is
+    dispatched as soon as its pages are ready, with at most LLM_CONCURRENCY requests queued.
+    Any request that ultimately failed (leaving a batch short of rules or pins) is recorded in
+    failures when given.
+    """
+    failures = [] if failures is None else failures
+    groups = iter_batches(batches, max(1, BATCHES_PER_REQUEST))
+    pin_lookup = normalize_pin_table(pin_table)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=LLM_CONCURRENCY)
+    results: Dict[int, List[List[Dict[str, Any]]]] = {}
+
+    async def worker(limiter: OpenAIRateLimiter) -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            n, group = item
+            try:
+                results[n] = await extract_rules_from_content_batches_async(
+                    limiter, group, pin_context, device_name, pin_table, pin_lookup, failures
+                )
+            except Exception as e:
+                # One failed request must not take the other workers' results down with it
+                print(f"Error extracting pages {group[0][0]['page']}-{group[-1][-1]['page']}: {e}")
+                failures.append(f"extraction of pages {group[0][0]['page']}-{group[-1][-1]['page']}")
+                results[n] = [[] for _ in group]
+            for batch, batch_rules in zip(group, results[n]):
+                print(f"Processed pages {batch[0]['page']}-{batch[-1]['page']}, found {len(batch_rules)} rules")
+
+    async with AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=httpx.AsyncClient(limits=HTTP_LIMITS, http2=HTTP2)) as client:
+        limiter = OpenAIRateLimiter(client, OPENAI_MAX_RPM, OPENAI_MAX_TPM, LLM_CONCURRENCY)
+        workers = [asyncio.create_task(worker(limiter)) for _ in range(LLM_CONCURRENCY)]
+        try:
+            n = 0
+            while True:
+                group = await asyncio.to_thread(next, groups, None)
+                if group is None:
+                    break
+                await queue.put((n, group))
+                n += 1
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+    return [batch_rules for n in range(len(results)) for batch_rules in results[n]]
+
+def extract_rules_from_content_batch(
+    content_sections: List[Dict],
+    pin_context: str,
+    device_name: str,
+    pin_table: List[List[str]],
+) -> List[Dict[str, Any]]:
+    """Synchronous single-batch extraction."""
+    return asyncio.run(extract_batches_async([content_sections], pin_context, device_name, pin_table))[0]
+
+# Datasheet references to strip from rule text, as one alternation so each rule is scanned once
+DATASHEET_REFERENCE_PATTERNS = [
+    r'\s*as per [Tt]able \d+',
+    r'\s*according to [Tt]able \d+',
+    r'\s*found in [Tt]able \d+',
+    r'\s*defined in [Tt]able \d+',
+    r'\s*specified in [Tt]able \d+',
+    r'\s*as per [Ss]ection \d+(\.\d+)*',
+    r'\s*according to [Ss]ection \d+(\.\d+)*',
+    r'\s*found in [Ss]ection \d+(\.\d+)*',
+    r'\s*defined in [Ss]ection \d+(\.\d+)*',
+    r'\s*specified in [Ss]ection \d+(\.\d+)*',
+    r'\s*as per [Ff]igure \d+',
+    r'\s*according to [Ff]igure \d+',
+    r'\s*found in [Ff]igure \d+',
+    r'\s*refer to [Tt]able \d+',
+    r'\s*see [Tt]able \d+',
+    r'\s*refer to [Ss]ection \d+(\.\d+)*',
+    r'\s*see [Ss]ection \d+(\.\d+)*',
+    r'\s*refer to [Ff]igure \d+',
+    r'\s*see [Ff]igure \d+',
+    r'\s*per datasheet recommendations?',
+    r'\s*as specified in the datasheet',
+    r'\s*according to the datasheet',
+    r'\s*refer to the? datasheet',
+    r'\s*see the? datasheet',
+    r'\s*according to [A-Z][A-Z0-9_]+\s+[a-z][a-z\s]+version\s+[\d\.\w\s]+',
+    r'\s*as per [A-Z][A-Z0-9_]+\s+[a-z][a-z\s]+version\s+[\d\.\w\s]+',
+    r'\s*following [A-Z][A-Z0-9_]+\s+[a-z][a-z\s]+version\s+[\d\.\w\s]+'
+]
+DATASHEET_REFERENCE_RE = re.compile("|".join(f"(?:{p})" for p in DATASHEET_REFERENCE_PATTERNS), re.IGNORECASE)
+# The whole trailing run of spaces, commas and periods, so cleaning is idempotent
+TRAILING_PUNCT_RE = re.compile(r'[\s,.]*$')
+
 
 def clean_datasheet_references(rule_text: str) -> str:
     """Remove any remaining datasheet references from rule text."""
-    # Patterns to remove
-    patterns_to_remove = [
-        r'\s*as per [Tt]able \d+',
-        r'\s*according to [Tt]able \d+',
-        r'\s*found in [Tt]able \d+',
-        r'\s*defined in [Tt]able \d+',
-        r'\s*specified in [Tt]able \d+',
-        r'\s*as per [Ss]ection \d+(\.\d+)*',
-        r'\s*according to [Ss]ection \d+(\.\d+)*',
-        r'\s*found in [Ss]ection \d+(\.\d+)*',
-        r'\s*defined in [Ss]ection \d+(\.\d+)*',
-        r'\s*specified in [Ss]ection \d+(\.\d+)*',
-        r'\s*as per [Ff]igure \d+',
-        r'\s*according to [Ff]igure \d+',
-        r'\s*found in [Ff]igure \d+',
-        r'\s*refer to [Tt]able \d+',
-        r'\s*see [Tt]able \d+',
-        r'\s*refer to [Ss]ection \d+(\.\d+)*',
-        r'\s*see [Ss]ection \d+(\.\d+)*',
-        r'\s*refer to [Ff]igure \d+',
-        r'\s*see [Ff]igure \d+',
-        r'\s*per datasheet recommendations?',
-        r'\s*as specified in the datasheet',
-        r'\s*according to the datasheet',
-        r'\s*refer to the? datasheet',
-        r'\s*see the? datasheet',
-        r'\s*according to [A-Z][A-Z0-9_]+\s+[a-z][a-z\s]+version\s+[\d\.\w\s]+',
-        r'\s*as per [A-Z][A-Z0-9_]+\s+[a-z][a-z\s]+version\s+[\d\.\w\s]+',
-        r'\s*following [A-Z][A-Z0-9_]+\s+[a-z][a-z\s]+version\s+[\d\.\w\s]+'
-    ]
-    
-    cleaned_text = rule_text
-    for pattern in patterns_to_remove:
-        cleaned_text = re.sub(pattern, '', cleaned_text, flags=re.IGNORECASE)
+    cleaned_text = DATASHEET_REFERENCE_RE.sub('', rule_text)
     
     # Clean up any trailing periods or commas that might be left
-    cleaned_text = re.sub(r'\s*[,.]?\s*$', '.', cleaned_text)
+    cleaned_text = TRAILING_PUNCT_RE.sub('.', cleaned_text, count=1)
     cleaned_text = cleaned_text.strip()
     
     return cleaned_text
 
-def remove_duplicate_rules(rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Remove duplicate rules while preserving order and cleaning datasheet references."""
-    seen_rules = set()
+def remove_duplicate_rules(
+    rules: List[Dict[str, Any]], seen_rules: Optional[Set[str]] = None, clean: bool = True
+) -> List[Dict[str, Any]]:
+    """Remove duplicate rules while preserving order and cleaning datasheet references.
+
+    Pass the same seen_rules set across calls to dedup a stream of batches incrementally.
+    clean=False only deduplicates, for rules that already went through a cleaning pass.
+    """
+    if seen_rules is None:
+        seen_rules = set()
     unique_rules = []
     
     for rule in rules:
         # Clean datasheet references first
-        cleaned_rule_text = clean_datasheet_references(rule["rule"])
+        cleaned_rule_text = clean_datasheet_references(rule["rule"]) if clean else rule["rule"]
         
         # Skip rules that are too short after cleaning (likely just references)
-        if len(cleaned_rule_text.strip()) < 20:
+        if clean and len(cleaned_rule_text.strip()) < 20:
             continue
             
         rule_text_key = cleaned_rule_text.lower().strip()
@@ -430,17 +1120,105 @@ def remove_duplicate_rules(rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     
     return unique_rules
 
+def merge_pins(target: Dict[str, Any], source: Dict[str, Any]) -> None:
+    if source.get("pins"):
+        merged = dict.fromkeys(target.get("pins", []))
+        merged.update(dict.fromkeys(source["pins"]))
+        target["pins"] = list(merged)
+
+def remove_lexical_near_duplicates(rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop rules whose word-set Jaccard similarity to an earlier rule reaches MINHASH_THRESHOLD.
+
+    Uses a MinHash LSH index (datasketch, optional), so cheap rewordings are removed without
+    pairwise comparison and before the embedding pass. No-op without datasketch.
+    """
+    if MinHashLSH is None or len(rules) < 2:
+        return rules
+
+    lsh = MinHashLSH(threshold=MINHASH_THRESHOLD, num_perm=MINHASH_NUM_PERM)
+    kept: List[Dict[str, Any]] = []
+    for rule in rules:
+        mh = MinHash(num_perm=MINHASH_NUM_PERM)
+        mh.update_batch([tok.encode("utf-8") for tok in set(rule["rule"].lower().split())])
+        matches = lsh.query(mh)
+        if matches:
+            merge_pins(kept[min(matches)], rule)
+            continue
+        lsh.insert(len(kept), mh)
+        kept.append(rule)
+
+    if len(kept) < len(rules):
+        print(f"Removed {len(rules) - len(kept)} reworded duplicate rules")
+    return kept
+
+def remove_near_duplicate_rules(rules: List[Dict[str, Any]], failures: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Drop paraphrased rules whose embedding is within RULE_DEDUP_SIMILARITY of an earlier one.
+
+    All rule texts are embedded in one request; the first occurrence is kept and absorbs the
+    pins of its duplicates. Falls back to the input unchanged without numpy or on API errors;
+    the latter are recorded in failures when given.
+    FAISS, when installed, replaces the dense similarity scan for large rule sets.
+    """
+    if np is None or RULE_DEDUP_SIMILARITY <= 0 or len(rules) < 2:
+        return rules
+
+    try:
+        client = get_client()
+        response = client.embeddings.create(model=EMBEDDING_MODEL, input=[r["rule"] for r in rules])
+    except Exception as e:
+        print(f"Error embedding rules for dedup: {e}")
+        if failures is not None:
+            failures.append("rule embedding")
+        return rules
+
+    vectors = np.asarray([d.embedding for d in response.data], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    index = faiss.IndexFlatIP(vectors.shape[1]) if faiss is not None and len(rules) > 500 else None
+    kept: List[int] = []
+    for i, vec in enumerate(vectors):
+        match = -1
+        if index is not None:
+            if index.ntotal:
+                scores, ids = index.search(vec[None, :], 1)
+                if scores[0, 0] >= RULE_DEDUP_SIMILARITY:
+                    match = kept[ids[0, 0]]
+        elif kept:
+            scores = vectors[kept] @ vec
+            best = int(scores.argmax())
+            if scores[best] >= RULE_DEDUP_SIMILARITY:
+                match = kept[best]
+
+        if match < 0:
+            kept.append(i)
+            if index is not None:
+                index.add(vec[None, :])
+        else:
+            merge_pins(rules[match], rules[i])
+
+    if len(kept) < len(rules):
+        print(f"Removed {len(rules) - len(kept)} near-duplicate rules")
+    return [rules[i] for i in kept]
+
+def html_text(html: str) -> str:
+    """All text of an HTML document; selectolax when installed, else BeautifulSoup (lxml if available)."""
+    if SelectolaxHTMLParser is not None:
+        tree = SelectolaxHTMLParser(html)
+        # bs4's get_text() skips script/style/template strings; lexbor's text() does not.
+        tree.strip_tags(["script", "style", "template"])
+        return tree.root.text() if tree.root is not None else ""
+    return BeautifulSoup(html, HTML_PARSER).get_text()
+
 def extract_rules_for_html(file_path: Path, pin_table: List[List[str]]) -> List[Dict[str, Any]]:
     """Extract rules from HTML file using LLM."""
+    require_api_key()
     try:
         html = file_path.read_text(encoding="utf-8", errors="ignore")
         # Convert HTML to text for LLM processing
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(html, 'html.parser')
-        text_content = soup.get_text()
+        text_content = html_text(html)
         
         # Clean and process like PDF content
-        cleaned_content = clean_text(text_content)
+        cleaned_content = cap_tokens(clean_text(text_content), HTML_TOKEN_BUDGET, file_path.name)
         pin_context = extract_pin_context(pin_table)
         
         # Process as single batch
@@ -456,29 +1234,48 @@ def extract_rules_for_html(file_path: Path, pin_table: List[List[str]]) -> List[
         print(f"Error processing HTML file: {e}")
         return []
 
-def extract_rules_for_pdf(file_path: Path, pin_table: List[List[str]]) -> List[Dict[str, Any]]:
+def extract_rules_for_pdf(file_path: Path, pin_table: List[List[str]], use_batch_api: bool = USE_BATCH_API) -> List[Dict[str, Any]]:
     """Extract rules from PDF file using comprehensive LLM analysis."""
-    return extract_comprehensive_rules_from_datasheet(file_path, pin_table)
+    return extract_comprehensive_rules_from_datasheet(file_path, pin_table, use_batch_api)
 
-def build_grouping_prompt(rules: List[Dict[str, Any]]) -> str:
-    """Build prompt for grouping and categorizing rules."""
-    
-    # Format the rules for the prompt
-    rules_text = []
-    for i, rule in enumerate(rules, 1):
-        rule_text = rule.get("rule", "")
-        category = rule.get("category", "")
-        essential = rule.get("essential", False)
-        pins = rule.get("pins", [])
-        pins_str = ", ".join(pins) if pins else "None"
-        
-        rules_text.append(f"""Rule {i}:
-Text: {rule_text}
-Current Category: {category}
-Essential: {essential}
-Pins: {pins_str}""")
+# Keyword categorization applied before any LLM grouping; first match wins, so specific
+# categories come before the broad pin/power ones
+CATEGORY_PATTERNS = [
+    (re.compile(r'\bESD\b|electrostatic|\bTVS\b', re.I), "ESD Protection"),
+    (re.compile(r'decoupl|bypass', re.I), "Decoupling Capacitors"),
+    (re.compile(r'crystal|\bXTAL|oscillator', re.I), "Crystal Oscillator"),
+    (re.compile(r'\bI2C\b|\bI²C\b|\bSDA\b|\bSCL\b', re.I), "I2C Interface"),
+    (re.compile(r'\bSPI\b|\bMOSI\b|\bMISO\b|\bSCLK\b', re.I), "SPI Interface"),
+    (re.compile(r'\bUART\b|\bTXD\b|\bRXD\b', re.I), "UART Interface"),
+    (re.compile(r'\bUSB\b', re.I), "USB Interface"),
+    (re.compile(r'impedance|trace length|differential pair|signal integrity', re.I), "Signal Integrity"),
+    (re.compile(r'ground plane|power plane|\bgrounding\b|\bAGND\b|\bDGND\b', re.I), "Grounding and Power Plane"),
+    (re.compile(r'pull-?up|pull-?down', re.I), "Pin Connection"),
+    (re.compile(r'\b(?:VDD\w*|VCC\w*|VBAT|VIN|supply|voltage)\b', re.I), "Power Supply Voltage"),
+]
+
+def categorize_rule(rule_text: str) -> Optional[str]:
+    for pattern, category in CATEGORY_PATTERNS:
+        if pattern.search(rule_text):
+            return category
+    return None
+
+def build_grouping_prompt(rules: List[Dict[str, Any]], categories: Iterable[str] = ()) -> str:
+    """Build prompt for grouping and categorizing rules; categories are ones already in use."""
     
-    all_rules_text = "\n\n".join(rules_text)
+    # Compact JSON keeps the per-rule labels and whitespace out of the token count
+    rules_payload = json_dumps([
+        {
+            "i": i,
+            "text": rule.get("rule", ""),
+            "cat": rule.get("category", ""),
+            "essential": rule.get("essential", False),
+            "pins": rule.get("pins", []),
+        }
+        for i, rule in enumerate(rules, 1)
+    ]).decode("utf-8")
+    categories = sorted(set(categories))
+    existing = f"- Reuse these categories already assigned to other rules where they fit: {', '.join(categories)}\n" if categories else ""
     
     return f"""You are an expert hardware design engineer. Given a set of design rules extracted from a datasheet, 
 reorganize and categorize them to create a cohesive, well-structured ruleset.
@@ -492,62 +1289,72 @@ CATEGORIZATION GUIDELINES:
 - Keep essential/non-essential classification unchanged
 - Keep pin assignments unchanged
 - Keep rule text unchanged
+{existing}
+CURRENT RULESET ({len(rules)} rules, JSON; "cat" is the current category):
+{rules_payload}
 
-CURRENT RULESET ({len(rules)} rules):
-
-{all_rules_text}
+Return the same rules, in the same order, with updated, consolidated categories. Focus on creating 8-12 main categories that logically group the rules."""
 
-Return the same rules with updated, consolidated categories. Focus on creating 8-12 main categories that logically group the rules."""
+def group_and_categorize_rules(rules: List[Dict[str, Any]], failures: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Group and categorize rules into a cohesive ruleset.
 
-def group_and_categorize_rules(rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Group and categorize rules using LLM to create a cohesive ruleset."""
+    Rules matching CATEGORY_PATTERNS are categorized locally; only the rest are sent to the LLM,
+    which is asked to reuse the locally assigned categories where they fit. A failed LLM call
+    leaves those rules as extracted and is recorded in failures when given.
+    """
+    failures = [] if failures is None else failures
     
     if not rules:
         return rules
         
     print(f"Grouping and categorizing {len(rules)} rules...")
     
-    try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        prompt = build_grouping_prompt(rules)
-        
-        completion = client.beta.chat.completions.parse(
-            model="gpt-5-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert at organizing hardware design rules into logical, cohesive categories."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format=GroupedRulesResponse,
-            max_completion_tokens=50000
-        )
-        
-        if completion.choices[0].message.parsed:
-            grouped_response = completion.choices[0].message.parsed
-            grouped_rules = [
-                {
-                    "rule": rule.rule,
-                    "category": rule.category,
-                    "essential": rule.essential,
-                    "pins": rules[i].get("pins", [])  # Preserve original pins
-                }
-                for i, rule in enumerate(grouped_response.rules)
-            ]
+    grouped_rules = [dict(rule) for rule in rules]
+    unmatched: List[int] = []
+    local_categories: Set[str] = set()
+    for i, rule in enumerate(grouped_rules):
+        category = categorize_rule(str(rule.get("rule", "")))
+        if category:
+            rule["category"] = category
+            local_categories.add(category)
+        else:
+            unmatched.append(i)
+    
+    if unmatched:
+        print(f"Categorizing {len(unmatched)} rules without a keyword match with the LLM...")
+        try:
+            client = get_client()
+            prompt = build_grouping_prompt([rules[i] for i in unmatched], categories=local_categories)
             
-            # Print category summary
-            categories = {}
-            for rule in grouped_rules:
-                cat = rule["category"]
-                categories[cat] = categories.get(cat, 0) + 1
+            completion = client.beta.chat.completions.parse(
+                model=GROUPING_MODEL,
+                messages=[
+                    {"role": "system", "content": "You are an expert at organizing hardware design rules into logical, cohesive categories."},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format=GroupedRulesResponse,
+                max_completion_tokens=50000
+            )
             
-            print(f"Grouped into {len(categories)} categories:")
-            for cat, count in sorted(categories.items()):
-                print(f"  - {cat}: {count} rules")
+            if completion.choices[0].message.parsed:
+                for i, rule in zip(unmatched, completion.choices[0].message.parsed.rules):
+                    grouped_rules[i].update(rule=rule.rule, category=rule.category, essential=rule.essential)
+            else:
+                print("Failed to parse grouped rules response")
+                failures.append("rule grouping")
                 
-            return grouped_rules
-        else:
-            print("Failed to parse grouped rules response")
-            return rules
-            
-    except Exception as e:
-        print(f"Error grouping rules: {e}")
-        return rules
\ No newline at end of file
+        except Exception as e:
+            print(f"Error grouping rules: {e}")
+            failures.append("rule grouping")
+    
+    # Print category summary
+    categories = {}
+    for rule in grouped_rules:
+        cat = rule["category"]
+        categories[cat] = categories.get(cat, 0) + 1
+    
+    print(f"Grouped into {len(categories)} categories:")
+    for cat, count in sorted(categories.items()):
+        print(f"  - {cat}: {count} rules")
+        
+    return grouped_rules
@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 
-import json
 import sys
 from pathlib import Path
 from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
 from identify import identify_file
+from json_io import dumps_indented, loads as json_loads
+
+# fix_rule_file is dominated by file I/O (and cached identify_file lookups)
+MAX_WORKERS = 16
 
 def fix_rule_file(file_path: Path) -> bool:
     """
@@ -15,8 +19,7 @@ def fix_rule_file(file_path: Path) -> bool:
     """
     try:
         # Read the JSON file
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = json_loads(file_path.read_bytes())
         
         if not isinstance(data, dict) or len(data) != 1:
             print(f"Warning: {file_path.name} doesn't have expected structure (single top-level key)")
@@ -57,8 +60,7 @@ def fix_rule_file(file_path: Path) -> bool:
         new_data = {device_name: content}
         
         # Write back to file
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(new_data, f, indent=2, ensure_ascii=False)
+        file_path.write_bytes(dumps_indented(new_data))
         
         print(f"Fixed: {file_path.name} - changed '{current_key}' to '{device_name}'")
         return True
@@ -86,10 +88,8 @@ def main():
     
     print(f"Found {len(json_files)} JSON files to process")
     
-    fixed_count = 0
-    for json_file in json_files:
-        if fix_rule_file(json_file):
-            fixed_count += 1
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        fixed_count = sum(executor.map(fix_rule_file, json_files))
     
     print(f"\nProcessing complete:")
     print(f"- Total files: {len(json_files)}")
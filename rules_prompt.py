@@ -1,9 +1,9 @@
-from hyperparams import get as H
+from hyperparams import HP
 
 # THIS FILE IS NOT USED!!!! JUST HERE FOR REFERENCE
 
 PLANNER_PROMPT = (
-    (H("PROMPT_PREFIX") or "") +
+    (HP.PROMPT_PREFIX or "") +
     "\nYou are analyzing semiconductor datasheet sections to find the most valuable ones for extracting COMPREHENSIVE SCHEMATIC DESIGN rules.\n"
     "Focus on sections that help with PHYSICAL CIRCUIT DESIGN and COMPONENT CONNECTIONS:\n\n"
     "PRIORITY SECTIONS (select these if found):\n"
@@ -2,42 +2,63 @@
 
 import warnings
 import os
+import sys
+import heapq
+import multiprocessing
+import re
 warnings.filterwarnings("ignore")
 os.environ['PYTHONWARNINGS'] = 'ignore'
 
-from typing import List, Dict, Any
-from bs4 import BeautifulSoup
+from typing import Callable, List, Dict, Any, Tuple
+from collections import Counter
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup, SoupStrainer
 import pdfplumber
-from hyperparams import get as H
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+from hyperparams import HP, get as H, page_workers
+from identify import HTML_PARSER, SelectolaxHTMLParser, selectolax_text
+
+HEADING_TAGS = {"h1","h2","h3","h4","h5","h6"}
+# build_html_graph only reads these tags; everything else (scripts, nav, styling) is never built
+GRAPH_TAGS = SoupStrainer([*HEADING_TAGS, "p", "table", "tr", "td", "th"])
 
 def build_html_graph(html: str) -> List[Dict[str, Any]]:
-    soup = BeautifulSoup(html, 'html.parser')
+    if SelectolaxHTMLParser is not None:
+        return build_html_graph_selectolax(html)
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=GRAPH_TAGS)
     nodes: List[Dict[str, Any]] = []
     
-    # Extract sections
-    for h in soup.find_all(["h1","h2","h3","h4","h5","h6"]):
-        title = h.get_text(" ", strip=True)
-        block = []
-        cur = h
-        while cur and len(block) < 10:
-            cur = cur.find_next()
-            if not cur:
-                break
-            if cur.name and cur.name.lower() in ["h1","h2","h3","h4","h5","h6"]:
-                break
-            if cur.name == 'p':
-                t = cur.get_text(" ", strip=True)
-                if t:
-                    block.append(t)
-        text = "\n".join(block)
-        if text:
-            nodes.append({"type":"section","title":title,"text":text})
+    # Extract sections in one document-order pass: each heading collects up to 10 of the
+    # paragraphs that follow it, until the next heading
+    title = None
+    block: List[str] = []
+    for el in soup.find_all(True):
+        name = el.name.lower()
+        if name in HEADING_TAGS:
+            if block:
+                nodes.append({"type":"section","title":title,"text":"\n".join(block)})
+            title = " ".join(el.stripped_strings)
+            block = []
+        elif name == 'p' and title is not None and len(block) < 10:
+            t = " ".join(el.stripped_strings)
+            if t:
+                block.append(t)
+    if block:
+        nodes.append({"type":"section","title":title,"text":"\n".join(block)})
     
     # Extract tables
     for i, t in enumerate(soup.find_all('table')):
         rows = []
         for tr in t.find_all('tr')[:20]:
-            cells = [c.get_text(" ", strip=True) for c in tr.find_all(['td','th'])]
+            cells = [" ".join(c.stripped_strings) for c in tr.find_all(['td','th'])]
             if cells:
                 rows.append("\t".join(cells))
         if rows:
@@ -45,95 +66,236 @@ def build_html_graph(html: str) -> List[Dict[str, Any]]:
     
     return nodes
 
-def build_pdf_graph(pdf_path: str, max_pages: int = None) -> List[Dict[str, Any]]:
+def build_html_graph_selectolax(html: str) -> List[Dict[str, Any]]:
+    """selectolax port of build_html_graph; the tree is built and its text read in C."""
+    tree = SelectolaxHTMLParser(html)
+    nodes: List[Dict[str, Any]] = []
+    if tree.root is None:
+        return nodes
+    
+    # Extract sections (same single document-order pass as build_html_graph)
+    title = None
+    block: List[str] = []
+    for el in tree.root.traverse(include_text=False):
+        if el.tag in HEADING_TAGS:
+            if block:
+                nodes.append({"type":"section","title":title,"text":"\n".join(block)})
+            title = selectolax_text(el)
+            block = []
+        elif el.tag == 'p' and title is not None and len(block) < 10:
+            t = selectolax_text(el)
+            if t:
+                block.append(t)
+    if block:
+        nodes.append({"type":"section","title":title,"text":"\n".join(block)})
+    
+    # Extract tables
+    for t in tree.css('table'):
+        rows = []
+        for tr in t.css('tr')[:20]:
+            cells = [selectolax_text(c) for c in tr.css('td,th')]
+            if cells:
+                rows.append("\t".join(cells))
+        if rows:
+            nodes.append({"type":"table","title":"table","text":"\n".join(rows)})
+    
+    return nodes
+
+PDF_PAGES_PER_WORKER = 5
+
+def pdf_text_backend(backend: str = None) -> str:
+    backend = backend or HP.PDF_BACKEND
+    return 'pypdfium2' if backend == 'pypdfium2' and pdfium is not None else 'pdfplumber'
+
+def pdfium_page_text(doc, i: int) -> str:
+    textpage = doc[i].get_textpage()
+    try:
+        return textpage.get_text_range().replace('\r\n', '\n')
+    finally:
+        textpage.close()
+
+def page_nodes(page, i: int, pdfium_doc=None) -> List[Dict[str, Any]]:
+    nodes: List[Dict[str, Any]] = []
+    # Simple text extraction
+    text = ""
+    try:
+        text = (pdfium_page_text(pdfium_doc, i) if pdfium_doc is not None else page.extract_text()) or ""
+    except Exception:
+        return nodes
+    
+    if text.strip():
+        # Simple section splitting
+        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+        for j, para in enumerate(paragraphs):
+            if len(para) > 50:  # Only substantial paragraphs
+                nodes.append({
+                    "type": "section", 
+                    "title": f"Page {i+1} Section {j+1}", 
+                    "text": para
+                })
+    
+    # Simple table extraction. pdfplumber's default ("lines") strategy builds tables only from
+    # ruling edges, so pages without any are skipped without running table detection.
+    try:
+        if not page.edges:
+            return nodes
+        tables = page.extract_tables()
+        for t_idx, table in enumerate(tables or []):
+            if table and len(table) > 1:
+                rows = []
+                for row in table:
+                    if row:
+                        cells = [str(cell or "").strip() for cell in row]
+                        if any(cell for cell in cells):
+                            rows.append("\t".join(cells))
+                if rows:
+                    nodes.append({
+                        "type": "table",
+                        "title": f"Page {i+1} Table {t_idx+1}",
+                        "text": "\n".join(rows)
+                    })
+    except Exception:
+        pass
+    return nodes
+
+def pdf_page_nodes(pdf_path: str, start: int, stop: int, backend: str = 'pdfplumber') -> List[Dict[str, Any]]:
+    """Process-pool worker: nodes for pages [start, stop) of pdf_path."""
+    nodes: List[Dict[str, Any]] = []
+    pdfium_doc = pdfium.PdfDocument(pdf_path) if backend == 'pypdfium2' else None
+    try:
+        # pages= makes pdfplumber build only this run's pages
+        with pdfplumber.open(pdf_path, pages=list(range(start + 1, stop + 1))) as pdf:
+            for i, page in enumerate(pdf.pages, start):
+                nodes.extend(page_nodes(page, i, pdfium_doc))
+    finally:
+        if pdfium_doc is not None:
+            pdfium_doc.close()
+    return nodes
+
+def pdf_page_count(pdf_path: str, max_pages: int) -> int:
+    """Number of pages of pdf_path, capped at max_pages when it is positive."""
+    if pdfium is not None:
+        doc = pdfium.PdfDocument(pdf_path)
+        try:
+            page_count = len(doc)
+        finally:
+            doc.close()
+        return min(page_count, max_pages) if max_pages > 0 else page_count
+    # Without pypdfium2, let pdfplumber build Page objects for the first max_pages pages only
+    with pdfplumber.open(pdf_path, pages=list(range(1, max_pages + 1)) if max_pages > 0 else None) as pdf:
+        return len(pdf.pages)
+
+def build_pdf_graph(pdf_path: str, max_pages: int = None, backend: str = None, workers: int = None) -> List[Dict[str, Any]]:
     nodes: List[Dict[str, Any]] = []
     if max_pages is None:
         max_pages = 10  # Simple limit
+    if workers is None:
+        workers = page_workers()  # serial inside a pool worker, so pools never nest
+    # pypdfium2 reads page text when selected (and installed); pdfplumber still finds tables
+    backend = pdf_text_backend(backend)
     
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            pages = pdf.pages[:max_pages] if max_pages > 0 else pdf.pages
-            
-            for i, page in enumerate(pages):
-                # Simple text extraction
-                text = ""
-                try:
-                    text = page.extract_text() or ""
-                except Exception:
-                    continue
-                
-                if text.strip():
-                    # Simple section splitting
-                    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-                    for j, para in enumerate(paragraphs):
-                        if len(para) > 50:  # Only substantial paragraphs
-                            nodes.append({
-                                "type": "section", 
-                                "title": f"Page {i+1} Section {j+1}", 
-                                "text": para
-                            })
-                
-                # Simple table extraction
-                try:
-                    tables = page.extract_tables()
-                    for t_idx, table in enumerate(tables or []):
-                        if table and len(table) > 1:
-                            rows = []
-                            for row in table:
-                                if row:
-                                    cells = [str(cell or "").strip() for cell in row]
-                                    if any(cell for cell in cells):
-                                        rows.append("\t".join(cells))
-                            if rows:
-                                nodes.append({
-                                    "type": "table",
-                                    "title": f"Page {i+1} Table {t_idx+1}",
-                                    "text": "\n".join(rows)
-                                })
-                except Exception:
-                    pass
-                    
+        page_count = pdf_page_count(pdf_path, max_pages)
+        if workers <= 1 or page_count <= PDF_PAGES_PER_WORKER:
+            # Serial when asked, or too few pages to pay for starting worker processes
+            return pdf_page_nodes(pdf_path, 0, page_count, backend)
+        
+        # pdfplumber is pure Python and CPU-bound, so page runs are extracted in parallel processes
+        starts = range(0, page_count, PDF_PAGES_PER_WORKER)
+        stops = [min(start + PDF_PAGES_PER_WORKER, page_count) for start in starts]
+        with ProcessPoolExecutor(
+            max_workers=min(len(starts), workers), mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            for run in executor.map(pdf_page_nodes, repeat(pdf_path), starts, stops, repeat(backend)):
+                nodes.extend(run)
     except Exception:
         pass
     
     return nodes
 
+class ChunkList(list):
+    """chunk_nodes output: the chunk dicts, plus their lowercased (title, text) in .lowered.
+
+    The lowercased copies live beside the chunks rather than on them, so chunks handed back by
+    retrieve carry only their public keys.
+    """
+    def __init__(self, chunks: List[Dict[str, Any]] = (), lowered: List[Tuple[str, str]] = None):
+        super().__init__(chunks)
+        self.lowered = lowered
+
+def lowered_chunks(chunks: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    lowered = getattr(chunks, 'lowered', None)
+    if lowered is not None and len(lowered) == len(chunks):
+        return lowered
+    return [(ch.get('title', '').lower(), ch.get('text', '').lower()) for ch in chunks]
+
 def chunk_nodes(nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     chunks: List[Dict[str, Any]] = []
+    # Lowercased once per corpus, so retrieve doesn't re-lower every chunk on every call
+    lowered: List[Tuple[str, str]] = [] if HP.RETRIEVAL_PRECOMPUTE else None
     for i, n in enumerate(nodes):
         text = n.get('text','')
         if not text:
             continue
+        n_type = n.get('type','')
+        n_title = n.get('title','')
+        title_lc = sys.intern(n_title.lower()) if lowered is not None else None
         if len(text) < 1500:
-            chunks.append({"id":f"n{i}","type":n.get('type',''),"title":n.get('title',''),"text":text})
+            chunks.append({"id":f"n{i}","type":n_type,"title":n_title,"text":text})
+            if lowered is not None:
+                lowered.append((title_lc, text.lower()))
         else:
-            # Simple chunking
-            parts = [text[j:j+1200] for j in range(0,len(text),1200)]
-            for k,p in enumerate(parts):
-                chunks.append({"id":f"n{i}_{k}","type":n.get('type',''),"title":n.get('title',''),"text":p})
-    return chunks
+            # Simple chunking; each 1200-char slice is cut as it is appended
+            for k, j in enumerate(range(0,len(text),1200)):
+                piece = text[j:j+1200]
+                chunks.append({"id":f"n{i}_{k}","type":n_type,"title":n_title,"text":piece})
+                if lowered is not None:
+                    lowered.append((title_lc, piece.lower()))
+    return ChunkList(chunks, lowered)
+
+# Relevant-content boost words, matched anywhere (as substrings) in one scan
+BOOST_RE = re.compile(r"pin|signal|connection|voltage|current")
+
+def query_counter(queries: List[str]) -> Callable[[str], int]:
+    """Return count(text) == sum(text.count(q.lower()) for q in queries), for lowercased text.
+
+    With pyahocorasick installed every query is matched in one scan of the text. Empty
+    queries are ignored.
+    """
+    weights = Counter(q.lower() for q in queries if q)
+    if ahocorasick is None or not weights:
+        return lambda text: sum(text.count(q) * w for q, w in weights.items())
+    automaton = ahocorasick.Automaton()
+    for idx, (q, w) in enumerate(weights.items()):
+        automaton.add_word(q, (idx, len(q), w))
+    automaton.make_automaton()
+
+    def count(text: str) -> int:
+        # str.count semantics: a hit only counts if it starts after the previous hit of the same query
+        last_end = [-1] * len(weights)
+        hits = 0
+        for end, (idx, length, w) in automaton.iter(text):
+            if end - length >= last_end[idx]:
+                last_end[idx] = end
+                hits += w
+        return hits
+    return count
 
 def retrieve(chunks: List[Dict[str, Any]], queries: List[str], k: int = None, comprehensive: bool = False) -> List[Dict[str, Any]]:
     if k is None:
         k = 10
     
+    count_hits = query_counter(queries)
     scored: List[tuple] = []
-    for ch in chunks:
-        title = ch.get('title', '').lower()
-        text = ch.get('text', '').lower()
-        
-        score = 0
-        for q in queries:
-            q_lower = q.lower()
-            score += title.count(q_lower) * 2
-            score += text.count(q_lower)
+    for ch, (title, text) in zip(chunks, lowered_chunks(chunks)):
+        score = count_hits(title) * 2 + count_hits(text)
         
         # Boost for relevant content
-        if any(word in text for word in ['pin', 'signal', 'connection', 'voltage', 'current']):
+        if BOOST_RE.search(text):
             score += 5
         
         if score > 0:
             scored.append((score, ch))
     
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [c for _, c in scored[:k]]
\ No newline at end of file
+    # Partial top-k selection; same order (ties included) as a full stable sort
+    return [c for _, c in heapq.nlargest(k, scored, key=lambda x: x[0])]
\ No newline at end of file
@@ -16,23 +16,23 @@ if __package__ is None or __package__ == "":
     from rules_generator import extract_rules_for_html, extract_rules_for_pdf
     from pin_table import extract_pin_tables
     from identify import identify_file
+    from json_io import dumps_indented
 else:
     from .rules_generator import extract_rules_for_html, extract_rules_for_pdf
     from .pin_table import extract_pin_tables
     from .identify import identify_file
+    from .json_io import dumps_indented
 
 OUT_DIR = Path('POWERBOM-2/output')
 
+def output_path(file_path: Path) -> Path:
+    return OUT_DIR / f"{file_path.stem}.json"
+
 def run_one(file_path: Path) -> Dict[str, str]:
     try:
         if file_path.suffix.lower() not in {'.html', '.htm', '.pdf'}:
             return {"file": file_path.name, "status": "skipped", "reason": "unsupported extension"}
 
-        # Check if corresponding JSON output already exists
-        out_path = OUT_DIR / f"{file_path.stem}.json"
-        if out_path.exists():
-            return {"file": file_path.name, "status": "skipped", "reason": "output already exists", "out": str(out_path)}
-
         pin_tables = extract_pin_tables(file_path)
         pin_table = []
         if pin_tables:
@@ -59,8 +59,8 @@ def run_one(file_path: Path) -> Dict[str, str]:
                 "footnote": "",
             }
         }
-        out_path = OUT_DIR / f"{file_path.stem}.json"
-        out_path.write_text(json.dumps(out, indent=2), encoding='utf-8')
+        out_path = output_path(file_path)
+        out_path.write_bytes(dumps_indented(out))
         return {"file": file_path.name, "status": "ok", "out": str(out_path)}
     except Exception as exc:
         return {"file": file_path.name, "status": "error", "error": str(exc)}
@@ -88,9 +88,22 @@ def main():
         print(json.dumps({"done": True, "out": str(OUT_DIR), "count": 0, "ok": 0, "skipped": 0, "errors": 0}))
         return
 
-    with ProcessPoolExecutor(max_workers=args.workers) as executor:
-        for res in executor.map(run_one, files):
-            results.append(res)
+    # Files whose JSON output already exists are skipped here, before any worker is started
+    pending = []
+    for p in files:
+        out_path = output_path(p)
+        if out_path.exists():
+            results.append({"file": p.name, "status": "skipped", "reason": "output already exists", "out": str(out_path)})
+        else:
+            pending.append(p)
+
+    # Hand each worker a few files per round trip so small files don't pay IPC per file,
+    # while still leaving ~4 chunks per worker for load balancing
+    chunksize = max(1, len(pending) // (max(1, args.workers) * 4))
+    if pending:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            for res in executor.map(run_one, pending, chunksize=chunksize):
+                results.append(res)
 
     ok = sum(1 for r in results if r.get("status") == "ok")
     skipped = sum(1 for r in results if r.get("status") == "skipped")
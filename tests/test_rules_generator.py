@@ -0,0 +1,96 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+for module in ("openai", "httpx", "pydantic", "dotenv", "bs4"):
+    pytest.importorskip(module)
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import rules_generator as rg  # noqa: E402
+
+RAW_RULES = [
+    {"rule": "Connect the VDD and VSS pins to the supply as per Table 5.", "category": "Power", "essential": True},
+    {"rule": "Place a 100 nF decoupling capacitor close to each VDD pin.", "category": "Power", "essential": True},
+]
+CLEAN_RULES = [
+    "Connect the VDD and VSS pins to the supply.",
+    "Place a 100 nF decoupling capacitor close to each VDD pin.",
+]
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    monkeypatch.setattr(rg, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(rg, "load_cached_rules", lambda key: None)
+    stored = []
+    monkeypatch.setattr(rg, "store_keyed", lambda kind, key, value: stored.append(kind))
+    monkeypatch.setattr(rg, "iter_content_sections", lambda pdf_bytes, source="PDF": iter([{"page": 1, "content": "datasheet text"}]))
+    monkeypatch.setattr(rg, "remove_near_duplicate_rules", lambda rules, failures=None: rules)
+    monkeypatch.setattr(rg, "group_and_categorize_rules", lambda rules, failures=None: rules)
+    return stored
+
+
+def copy_rules():
+    return [dict(r) for r in RAW_RULES]
+
+
+def test_clean_datasheet_references_is_idempotent():
+    for text in ("Tie NRST high as per Table 3.", "Keep traces short , .", "Ground the pad. ."):
+        cleaned = rg.clean_datasheet_references(text)
+        assert cleaned.endswith(".") and not cleaned.endswith("..")
+        assert rg.clean_datasheet_references(cleaned) == cleaned
+
+
+def test_async_path_cleans_each_rule_once(offline, monkeypatch, tmp_path):
+    async def request_batch_rules(limiter, batches, pin_context, device_name, model):
+        return [copy_rules() for _ in batches]
+
+    async def select_pins_for_rules_async(limiter, rule_texts, pin_table, pin_lookup, failures=None):
+        return [[] for _ in rule_texts]
+
+    monkeypatch.setattr(rg, "request_batch_rules", request_batch_rules)
+    monkeypatch.setattr(rg, "select_pins_for_rules_async", select_pins_for_rules_async)
+    pdf = tmp_path / "device.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+
+    rules = rg.extract_comprehensive_rules_from_datasheet(pdf, [["Pin", "Name"], ["1", "VDD"]], use_batch_api=False)
+
+    assert [r["rule"] for r in rules] == CLEAN_RULES
+    assert [r["rule"] for r in rg.remove_duplicate_rules([dict(r) for r in rules])] == CLEAN_RULES
+
+
+def test_batch_api_path_cleans_each_rule_once(offline, monkeypatch, tmp_path):
+    def run_batch(client, bodies, poll_seconds=30):
+        content = json.dumps({"rules": copy_rules()})
+        return {custom_id: {"choices": [{"message": {"content": content}}]} for custom_id in bodies}
+
+    monkeypatch.setattr(rg, "run_batch", run_batch)
+    monkeypatch.setattr(rg, "select_pins_with_batch_api", lambda client, rules, pin_table, pin_lookup, failures=None: None)
+    pdf = tmp_path / "device.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+
+    rules = rg.extract_comprehensive_rules_from_datasheet(pdf, [["Pin", "Name"], ["1", "VDD"]], use_batch_api=True)
+
+    assert [r["rule"] for r in rules] == CLEAN_RULES
+    assert [r["rule"] for r in rg.remove_duplicate_rules([dict(r) for r in rules])] == CLEAN_RULES
+
+
+def test_failed_pin_selection_is_not_cached(offline, monkeypatch, tmp_path):
+    async def request_batch_rules(limiter, batches, pin_context, device_name, model):
+        return [copy_rules() for _ in batches]
+
+    async def request_pins_for_rules(limiter, rule_texts, pin_table):
+        return [None for _ in rule_texts]
+
+    monkeypatch.setattr(rg, "request_batch_rules", request_batch_rules)
+    monkeypatch.setattr(rg, "request_pins_for_rules", request_pins_for_rules)
+    monkeypatch.setattr(rg, "load_keyed", lambda kind, key: None)
+    pdf = tmp_path / "device.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+
+    rules = rg.extract_comprehensive_rules_from_datasheet(pdf, [["Pin", "Name"], ["1", "VDD"]], use_batch_api=False)
+
+    assert [r["rule"] for r in rules] == CLEAN_RULES
+    assert rg.RULES_CACHE_KIND not in offline